@@ -6,8 +6,14 @@ try:
 except Exception:
     st = None
 
+import numpy as np
 import requests
 
+from density_grid import DensityGrid
+
+# Heatmap points closer than this are analyzed as one cell
+HEATMAP_CELL_METERS = 10.0
+
 
 def is_test_mode() -> bool:
     try:
@@ -170,38 +176,38 @@ def analyze_heatmap_data(heatmap_points: List[Tuple], zones: List[dict] = None,
     if not heatmap_points:
         return {"error": "No heatmap data available"}
     
+    points = np.asarray(heatmap_points, dtype=np.float64)
+    lats, lngs, intensities = points[:, 0], points[:, 1], points[:, 2]
+    
     # Calculate basic statistics
-    intensities = [point[2] for point in heatmap_points]
-    avg_intensity = sum(intensities) / len(intensities)
-    max_intensity = max(intensities)
-    min_intensity = min(intensities)
+    avg_intensity = float(intensities.mean())
+    max_intensity = float(intensities.max())
+    min_intensity = float(intensities.min())
     
-    # Find hotspots (areas with high intensity)
+    # Bin once; hotspots and zone statistics are read from the grid cells
+    grid = DensityGrid(lats, lngs, weights=intensities, cell_meters=HEATMAP_CELL_METERS)
+    
+    # Find hotspots (cells whose peak intensity is high)
     hotspot_threshold = avg_intensity + (max_intensity - avg_intensity) * 0.7
-    hotspots = [(point[0], point[1], point[2]) for point in heatmap_points if point[2] > hotspot_threshold]
+    hotspots = grid.hotspots(hotspot_threshold, layer="weight_max")
     
     # Analyze distribution
-    high_density_areas = [point for point in heatmap_points if point[2] > 0.7]
-    medium_density_areas = [point for point in heatmap_points if 0.3 < point[2] <= 0.7]
-    low_density_areas = [point for point in heatmap_points if point[2] <= 0.3]
+    high_density = int(np.count_nonzero(intensities > 0.7))
+    low_density = int(np.count_nonzero(intensities <= 0.3))
+    medium_density = len(intensities) - high_density - low_density
     
     # Zone analysis if zones provided
     zone_analysis = {}
     if zones:
-        for zone in zones:
-            zone_density = []
-            for point in heatmap_points:
-                # Simple distance check (in a real implementation, use proper zone boundary checking)
-                distance = ((point[0] - zone['center_lat'])**2 + (point[1] - zone['center_lng'])**2)**0.5
-                if distance < 0.001:  # Within zone area
-                    zone_density.append(point[2])
-            
-            if zone_density:
+        from geo_utils import grid_zone_stats
+        
+        for zone, stats in zip(zones, grid_zone_stats(grid, zones)):
+            if stats['count']:
                 zone_analysis[zone['name']] = {
-                    'avg_density': sum(zone_density) / len(zone_density),
-                    'max_density': max(zone_density),
-                    'point_count': len(zone_density),
-                    'zone_type': zone.get('zone_type', 'unknown')
+                    'avg_density': stats['weight_sum'] / stats['count'],
+                    'max_density': stats['weight_max'],
+                    'point_count': stats['count'],
+                    'zone_type': zone['zone_type'] if 'zone_type' in zone.keys() else 'unknown'
                 }
     
     return {
@@ -212,9 +218,9 @@ def analyze_heatmap_data(heatmap_points: List[Tuple], zones: List[dict] = None,
         'hotspots': hotspots,
         'hotspot_count': len(hotspots),
         'distribution': {
-            'high_density': len(high_density_areas),
-            'medium_density': len(medium_density_areas),
-            'low_density': len(low_density_areas)
+            'high_density': high_density,
+            'medium_density': medium_density,
+            'low_density': low_density
         },
         'zone_analysis': zone_analysis,
         'recent_incidents': incidents or [],
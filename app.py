@@ -12,6 +12,7 @@ from streamlit_folium import st_folium
 st.set_page_config(page_title="EventGuard AI", page_icon="🛡️", layout="wide")
 
 from core.ui import ensure_session, header, nav
+from db import start_retention_worker
 from features.auth_page import auth_page
 from features.event_setup import event_setup_page
 from features.dashboard import dashboard_page
@@ -22,6 +23,7 @@ from features.geo_fencing import geo_fencing_page
 from features.lost_found import lost_found_page
 
 def main():
+    start_retention_worker()
     ensure_session()
     header()
     if not st.session_state.auth.get("logged_in"):
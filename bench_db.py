@@ -0,0 +1,136 @@
+"""
+Latency benchmark for the dashboard's list_* queries.
+
+Seeds a throwaway database with a long event's worth of rows (1M geo alerts
+by default, plus lost & found reports, events, blueprints and zones), then
+times every list_* helper and fails if any call's median exceeds its
+budget. Run it after touching the schema or the indexes in db.py:
+
+    python bench_db.py --alerts 1000000 --budget-ms 25
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SEED_CHUNK = 50000
+
+
+def seed(db, alerts: int, reports: int, zones: int, organizers: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    with db.transaction() as cur:
+        cur.executemany(
+            "INSERT INTO users (email, hashed_password) VALUES (?, ?)",
+            [(f"organizer{i}@example.com", b"x") for i in range(organizers)],
+        )
+        cur.executemany(
+            """INSERT INTO events (organizer_id, event_name, goal, target_audience, date_time,
+               venue_name, address, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(1 + i % organizers, f"Event {i}", "", "", start.isoformat(), "", "", "")
+             for i in range(organizers * 20)],
+        )
+        cur.executemany(
+            """INSERT INTO venue_blueprints (event_id, blueprint_name, file_path, original_filename,
+               is_active, uploaded_at) VALUES (?, ?, ?, ?, ?, ?)""",
+            [(1 + i % (organizers * 20), f"Blueprint {i}", f"blueprints/{i}.png", f"{i}.png",
+              int(i % 3 == 0), (start + timedelta(minutes=i)).isoformat())
+             for i in range(organizers * 60)],
+        )
+        cur.executemany(
+            """INSERT INTO zones (name, zone_type, center_lat, center_lng, radius_meters,
+               is_active, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [(f"Zone {i}", "restricted", 28.6 + i * 1e-4, 77.2, 50.0, int(i % 4 != 0),
+              (start + timedelta(minutes=i)).isoformat()) for i in range(zones)],
+        )
+    for offset in range(0, alerts, SEED_CHUNK):
+        with db.transaction() as cur:
+            cur.executemany(
+                """INSERT INTO geo_alerts (zone_id, alert_type, entity_id, message, severity,
+                   is_resolved, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [(rng.randint(1, zones), "restricted_entry", f"entity-{rng.randrange(5000)}",
+                  "", "high", int(rng.random() < 0.98),
+                  (start + timedelta(milliseconds=50 * i)).isoformat())
+                 for i in range(offset, min(offset + SEED_CHUNK, alerts))],
+            )
+    statuses = ("active", "resolved", "closed")
+    with db.transaction() as cur:
+        cur.executemany(
+            """INSERT INTO lost_found_reports (report_type, person_name, status, timestamp)
+               VALUES (?, ?, ?, ?)""",
+            [(("lost", "found")[i % 2], f"Person {i}", statuses[rng.randrange(3)],
+              (start + timedelta(seconds=i)).isoformat()) for i in range(reports)],
+        )
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+
+
+def bench(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the db list_* queries")
+    parser.add_argument("--alerts", type=int, default=1000000)
+    parser.add_argument("--reports", type=int, default=200000)
+    parser.add_argument("--zones", type=int, default=200)
+    parser.add_argument("--organizers", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=25.0,
+                        help="per-call median latency budget")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="eventguard-bench-")
+    # db reads its path at import time, so point it at the scratch file first
+    os.environ["EVENTGUARD_DB"] = os.path.join(tmpdir, "bench.db")
+    os.environ["EVENTGUARD_ARCHIVE_DB"] = os.path.join(tmpdir, "bench_archive.db")
+    import db
+
+    db.init_db()
+    started = time.perf_counter()
+    seed(db, args.alerts, args.reports, args.zones, args.organizers)
+    print(f"seeded {args.alerts} alerts in {time.perf_counter() - started:.1f}s")
+
+    page = db.list_geo_alerts(limit=50, unresolved_only=False)
+    cursor = page[-1]
+    cases = {
+        "list_geo_alerts(unresolved)": lambda: db.list_geo_alerts(limit=50),
+        "list_geo_alerts(all)": lambda: db.list_geo_alerts(limit=50, unresolved_only=False),
+        "list_geo_alerts(next page)": lambda: db.list_geo_alerts(
+            limit=50, unresolved_only=False, before_ts=cursor["created_at"], before_id=cursor["id"]),
+        "list_lost_found_reports": lambda: db.list_lost_found_reports(limit=50),
+        "list_lost_found_reports(status)": lambda: db.list_lost_found_reports(limit=50, status="active"),
+        "list_events_by_user": lambda: db.list_events_by_user(1),
+        "list_blueprints_by_user": lambda: db.list_blueprints_by_user(1),
+        "get_blueprint_by_event": lambda: db.get_blueprint_by_event(3),
+        "list_zones": lambda: db.list_zones(),
+        "list_incidents": lambda: db.list_incidents(limit=50),
+        "list_alerts": lambda: db.list_alerts(limit=50),
+    }
+    failed = []
+    for name, fn in cases.items():
+        ms = bench(fn, args.repeat)
+        ok = ms <= args.budget_ms
+        print(f"{'ok  ' if ok else 'SLOW'} {name:36s} {ms:8.2f} ms")
+        if not ok:
+            failed.append(name)
+    db.close_connections()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    if failed:
+        sys.exit(f"over the {args.budget_ms:g} ms budget: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
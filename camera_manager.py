@@ -0,0 +1,219 @@
+"""
+Multi-camera crowd analytics service.
+
+Runs every active camera from the ``cameras`` table (device index, RTSP/HTTP
+URL or video file) on a pool of worker processes, one per CPU core by
+default. Each camera feeds a CameraPipeline; its detections are averaged
+into one (density, velocity) sample per second and written to the density
+store under the camera's zone with source ``camera:<name>``, where the
+predictive page forecasts from them and the dashboard shows per-zone
+readings (zone_density_summary).
+
+    python camera_manager.py --workers 8
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from db import add_density_samples, list_cameras, start_retention_worker
+
+log = logging.getLogger("eventguard.cameras")
+
+SAMPLE_SECONDS = 1.0
+FLUSH_SECONDS = 5.0
+RECONNECT_SECONDS = 5.0
+
+
+def camera_source(value: str):
+    """Device indexes are stored as text; OpenCV wants them as ints."""
+    value = str(value).strip()
+    return int(value) if value.isdigit() else value
+
+
+class _CameraFeed:
+    """One camera inside a worker process: its pipeline plus per-second sample averaging."""
+
+    def __init__(self, camera: Dict, sample_seconds: float):
+        self.camera = camera
+        self.zone = camera["zone"]
+        self.source_name = f"camera:{camera['name']}"
+        self.sample_seconds = sample_seconds
+        self.pipeline = None
+        self._retry_at = 0.0
+        self._bucket: Optional[float] = None
+        self._densities: List[float] = []
+        self._velocities: List[float] = []
+
+    def _open(self, now: float):
+        from camera_pipeline import CameraPipeline
+
+        camera = self.camera
+        self.pipeline = CameraPipeline(camera_source(camera["source"]), camera["area_m2"],
+                                       camera["meters_per_pixel"], camera["frame_stride"])
+        if not self.pipeline.start():
+            log.warning("camera %s: could not open %s", camera["name"], camera["source"])
+            self.pipeline = None
+            self._retry_at = now + RECONNECT_SECONDS
+
+    def poll(self, now: float) -> List[Tuple[float, float, Optional[float]]]:
+        """Closed per-second samples since the last poll; (re)opens the source as needed."""
+        if self.pipeline is None:
+            if now >= self._retry_at:
+                self._open(now)
+            return []
+        samples = self._aggregate(self.pipeline.drain_samples(), now)
+        if not self.pipeline.running:
+            # Stream dropped or file ended: reconnect (files start over)
+            self.pipeline.stop()
+            self.pipeline = None
+            self._retry_at = now + RECONNECT_SECONDS
+        return samples
+
+    def drain(self) -> List[Tuple[float, float, Optional[float]]]:
+        """Everything still buffered, including the open second (used on shutdown)."""
+        raw = self.pipeline.drain_samples() if self.pipeline is not None else []
+        return self._aggregate(raw, float("inf"))
+
+    def _aggregate(self, raw, now: float):
+        out = []
+        for ts, density, velocity in raw:
+            bucket = ts - (ts % self.sample_seconds)
+            if self._bucket is not None and bucket != self._bucket:
+                out.append(self._close())
+            self._bucket = bucket
+            self._densities.append(density)
+            if velocity is not None:
+                self._velocities.append(velocity)
+        if self._bucket is not None and now - self._bucket >= self.sample_seconds:
+            out.append(self._close())
+        return out
+
+    def _close(self):
+        sample = (self._bucket, sum(self._densities) / len(self._densities),
+                  sum(self._velocities) / len(self._velocities) if self._velocities else None)
+        self._bucket = None
+        self._densities, self._velocities = [], []
+        return sample
+
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+
+def camera_worker(cameras: List[Dict], stop, torch_threads: int = 1,
+                  sample_seconds: float = SAMPLE_SECONDS, flush_seconds: float = FLUSH_SECONDS):
+    """
+    Worker process entry point: run the given cameras until stop is set.
+    The cameras share this process's detector, so inference is serialized
+    per process and the pool as a whole uses one core per worker.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(message)s")
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    from detector import get_detector
+
+    get_detector()
+    feeds = [_CameraFeed(camera, sample_seconds) for camera in cameras]
+    try:
+        while True:
+            stopping = stop.wait(flush_seconds)
+            now = time.time()
+            for feed in feeds:
+                samples = feed.drain() if stopping else feed.poll(now)
+                if samples:
+                    add_density_samples(feed.zone, samples, source=feed.source_name)
+            if stopping:
+                return
+    finally:
+        for feed in feeds:
+            feed.stop()
+
+
+class CameraManager:
+    """
+    Runs cameras on a pool of worker processes. Cameras are dealt
+    round-robin across at most ``workers`` processes (default: CPU count);
+    ``run`` re-reads the camera table every ``refresh_seconds`` and
+    restarts the pool when cameras are added, changed or deactivated, or
+    when a worker process dies.
+    """
+
+    def __init__(self, workers: int = None, sample_seconds: float = SAMPLE_SECONDS,
+                 flush_seconds: float = FLUSH_SECONDS):
+        self.workers = workers or os.cpu_count() or 1
+        self.sample_seconds = sample_seconds
+        self.flush_seconds = flush_seconds
+        # spawn: the parent may hold threads and model state that must not be forked
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = None
+        self._processes: List = []
+        self.cameras: List[Dict] = []
+
+    def start(self, cameras: List[Dict]):
+        self.cameras = [dict(camera) for camera in cameras]
+        n = min(self.workers, len(self.cameras))
+        if not n:
+            return
+        torch_threads = max(1, (os.cpu_count() or 1) // n)
+        self._stop = self._ctx.Event()
+        for i in range(n):
+            shard = self.cameras[i::n]
+            process = self._ctx.Process(
+                target=camera_worker, name=f"camera-worker-{i}",
+                args=(shard, self._stop, torch_threads, self.sample_seconds, self.flush_seconds),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        log.info("started %d cameras on %d worker processes", len(self.cameras), n)
+
+    def stop(self, timeout: float = 30.0):
+        if self._stop is not None:
+            self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._stop = None
+
+    def healthy(self) -> bool:
+        return all(process.is_alive() for process in self._processes)
+
+    def run(self, refresh_seconds: float = 30.0):
+        try:
+            while True:
+                cameras = [dict(camera) for camera in list_cameras(active_only=True)]
+                if cameras != self.cameras or not self.healthy():
+                    self.stop()
+                    self.start(cameras)
+                time.sleep(refresh_seconds)
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EventGuard multi-camera crowd analytics")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--refresh", type=float, default=30.0,
+                        help="seconds between camera table re-reads")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    # Prune aged rows even when the web app is not running
+    start_retention_worker()
+    try:
+        CameraManager(args.workers).run(args.refresh)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
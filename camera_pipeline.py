@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from detector import PersonDetector, get_detector
+from flow_engine import FlowEstimator, box_centroids
+
+
+class LatestQueue:
+    """
+    Bounded hand-off between pipeline stages that keeps the newest items: a
+    put on a full queue drops the oldest one instead of blocking, so a slow
+    consumer always works on the most recent frame.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: float = None):
+        """Oldest queued item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+
+class CameraPipeline:
+    """
+    Capture -> detect -> flow pipeline for one camera or video source.
+
+    A reader thread grabs frames and hands every ``frame_stride``-th one to
+    the detection and optical-flow workers through LatestQueues, so each
+    stage runs at its own pace and stale frames are dropped rather than
+    queued: throughput is bounded by the slowest stage instead of the sum
+    of all of them. The caller renders from ``snapshot()`` (latest annotated
+    frame plus count, density, velocity and rate) and persists
+    ``drain_samples()``; neither blocks the workers. Video files are read at
+    their recorded frame rate (``CAP_PROP_FPS``), like a live camera, rather
+    than as fast as they decode.
+    """
+
+    def __init__(self, source, area_m2: float, meters_per_pixel: float, frame_stride: int = 1,
+                 detector: PersonDetector = None, queue_size: int = 1,
+                 rate_window_seconds: float = 300.0, flow: FlowEstimator = None):
+        self.source = source
+        self.area_m2 = max(float(area_m2), 1e-6)
+        self.meters_per_pixel = float(meters_per_pixel)
+        self.frame_stride = max(int(frame_stride), 1)
+        self.detector = detector
+        self.flow = flow or FlowEstimator(meters_per_pixel)
+        self.rate_window_seconds = rate_window_seconds
+        self._detect_q = LatestQueue(queue_size)
+        self._flow_q = LatestQueue(queue_size)
+        self._stop = threading.Event()
+        self._eof = threading.Event()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._cap = None
+        self._frame_interval = 0.0
+
+        self._frame = None
+        self._rects: List[Tuple[int, int, int, int]] = []
+        self._ema_count: Optional[float] = None
+        self._history = deque()
+        self._density = 0.0
+        self._rate_per_hour = 0.0
+        self._velocity: Optional[float] = None
+        self._samples: List[Tuple[float, float, Optional[float]]] = []
+        self._started_at = None
+        self._counts = {"read": 0, "detected": 0, "flow": 0}
+
+    def start(self) -> bool:
+        """Open the source and start the workers; False if it could not be opened."""
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            return False
+        if self.detector is None:
+            self.detector = get_detector()
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        self._frame_interval = 1.0 / fps if is_file and fps > 0 else 0.0
+        self._started_at = time.perf_counter()
+        for name, target in (("reader", self._read_loop), ("detect", self._detect_loop),
+                             ("flow", self._flow_loop)):
+            thread = threading.Thread(target=target, daemon=True, name=f"camera-{name}")
+            thread.start()
+            self._threads.append(thread)
+        return True
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _read_loop(self):
+        idx = 0
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            if (idx % self.frame_stride) != 0:
+                ok = self._cap.grab()
+            else:
+                ok, frame = self._cap.read()
+                if ok:
+                    # Stream position (files, RTSP); webcams report 0 and fall back to wall time
+                    pos = self._cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                    item = (time.time(), pos if pos > 0 else None, frame)
+                    self._detect_q.put(item)
+                    self._flow_q.put(item)
+                    self._counts["read"] += 1
+            if not ok:
+                break
+            idx += 1
+            if self._frame_interval:
+                # Hold file playback to its frame rate; if decoding falls behind, don't catch up in a burst
+                next_at += self._frame_interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_at = time.perf_counter()
+        self._eof.set()
+
+    def _next(self, q: LatestQueue):
+        while not self._stop.is_set():
+            item = q.get(timeout=0.1)
+            if item is not None:
+                return item
+            if self._eof.is_set():
+                return None
+        return None
+
+    def _detect_loop(self):
+        while True:
+            item = self._next(self._detect_q)
+            if item is None:
+                return
+            ts, _, frame = item
+            rects = self.detector.detect_people(frame)
+            count = len(rects)
+            density = count / self.area_m2
+            with self._lock:
+                if self._ema_count is None:
+                    self._ema_count = float(count)
+                else:
+                    self._ema_count = 0.3 * float(count) + 0.7 * self._ema_count
+                self._history.append((ts, self._ema_count))
+                while self._history[0][0] < ts - self.rate_window_seconds:
+                    self._history.popleft()
+                if len(self._history) >= 2:
+                    (t0, c0), (t1, c1) = self._history[0], self._history[-1]
+                    self._rate_per_hour = float((c1 - c0) / max(t1 - t0, 1e-3) * 3600.0)
+                self._frame = frame
+                self._rects = rects
+                self._density = density
+                self._samples.append((ts, density, self._velocity))
+                self._counts["detected"] += 1
+
+    def _flow_loop(self):
+        prev = None
+        while True:
+            item = self._next(self._flow_q)
+            if item is None:
+                return
+            ts, pos, frame = item
+            img = self.flow.prepare(frame)
+            if prev is not None:
+                prev_ts, prev_pos, prev_img, prev_points = prev
+                # Frames may have been dropped in between, so scale by the real time gap
+                if pos is not None and prev_pos is not None and pos > prev_pos:
+                    dt = pos - prev_pos
+                else:
+                    dt = max(ts - prev_ts, 1e-3)
+                mps = self.flow.estimate(prev_img, img, dt, points=prev_points)
+                with self._lock:
+                    if mps is not None:
+                        self._velocity = mps
+                    self._counts["flow"] += 1
+            with self._lock:
+                # Latest detections stand in for where people are in this frame
+                points = box_centroids(self._rects)
+            prev = (ts, pos, img, points)
+
+    def snapshot(self) -> Dict:
+        """Latest detected frame, its boxes and the running estimates."""
+        with self._lock:
+            elapsed = max(time.perf_counter() - self._started_at, 1e-6) if self._started_at else 0.0
+            return {
+                "seq": self._counts["detected"],
+                "frame": self._frame,
+                "rects": list(self._rects),
+                "count": int(self._ema_count or 0),
+                "density": self._density,
+                "velocity": self._velocity,
+                "rate_per_hour": self._rate_per_hour,
+                "stage_fps": {stage: n / elapsed if elapsed else 0.0
+                              for stage, n in self._counts.items()},
+                "dropped": {"detect": self._detect_q.dropped, "flow": self._flow_q.dropped},
+            }
+
+    def drain_samples(self) -> List[Tuple[float, float, Optional[float]]]:
+        """(ts, density, velocity) samples produced since the last call."""
+        with self._lock:
+            samples, self._samples = self._samples, []
+        return samples
@@ -105,3 +105,28 @@ def nav():
                 st.session_state.page = "auth"
             return choice
     return None
+
+
+def paginate(key: str, fetch_page, cursor_of, page_size: int = 20):
+    """
+    Render Newer/Older controls over a keyset-paginated list_* function and
+    return the rows for the current page. The cursor stack lives in session
+    state under ``key``; use a different key per filter combination.
+    """
+    stack = st.session_state.setdefault(f"{key}_cursors", [{}])
+    rows = fetch_page(limit=page_size + 1, **stack[-1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    cols = st.columns([1, 2, 1])
+    with cols[0]:
+        if st.button("← Newer", key=f"{key}_newer", disabled=len(stack) == 1):
+            stack.pop()
+            st.rerun()
+    with cols[1]:
+        st.caption(f"Page {len(stack)}")
+    with cols[2]:
+        if st.button("Older →", key=f"{key}_older", disabled=not has_more):
+            stack.append(cursor_of(rows[-1]))
+            st.rerun()
+    return rows
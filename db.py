@@ -1,6 +1,18 @@
 import sqlite3
 import os
-from datetime import datetime, timedelta
+import atexit
+import functools
+import queue
+import re
+import threading
+import time
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from geodesy import haversine_m
 
 DB_PATH = os.environ.get("EVENTGUARD_DB", None)
 
@@ -14,17 +26,239 @@ except Exception:
 if not DB_PATH:
     DB_PATH = "eventguard.db"
 
+ARCHIVE_DB_PATH = os.environ.get("EVENTGUARD_ARCHIVE_DB") or f"{os.path.splitext(DB_PATH)[0]}_archive.db"
+
+# Connection tuning. WAL lets readers proceed while a writer commits, and
+# synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+POOL_SIZE = int(os.environ.get("EVENTGUARD_DB_POOL_SIZE", "8"))
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),  # negative = KiB, i.e. ~16 MB page cache
+    ("mmap_size", 268435456),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+)
+
+# Optional write-behind queue for non-critical writes (see WriteBehindQueue)
+WRITE_BEHIND = os.environ.get("EVENTGUARD_WRITE_BEHIND", "false").lower() in ["1", "true", "yes"]
+try:
+    if "WRITE_BEHIND" in st.secrets.get("app", {}):
+        WRITE_BEHIND = bool(st.secrets["app"]["WRITE_BEHIND"])
+except Exception:
+    pass
+
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    """Open a new tuned connection. Prefer ``connection()``/``transaction()``,
+    which reuse pooled connections."""
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
     return conn
 
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    
+class ConnectionPool:
+    """
+    Small pool of long-lived connections shared by all helpers in this module.
+
+    A thread checks out one connection and keeps it for as long as it has
+    ``connection()``/``transaction()`` blocks open, so nested helpers share a
+    single connection and transaction. Idle connections are returned to the
+    pool; at most ``max_size`` idle connections are kept.
+    """
+
+    def __init__(self, factory, max_size: int = POOL_SIZE):
+        self._factory = factory
+        self._max_size = max_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def acquire(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            return conn
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._factory()
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self._max_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = ConnectionPool(get_conn)
+
+
+@contextmanager
+def connection():
+    """Check out the calling thread's pooled connection."""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    """
+    Run the block in a single transaction on the pooled connection and yield a
+    cursor. Nested ``transaction()`` blocks join the outermost one, which
+    commits on success and rolls back on error.
+    """
+    with connection() as conn:
+        local = _pool._local
+        outermost = getattr(local, "tx_depth", 0) == 0
+        local.tx_depth = getattr(local, "tx_depth", 0) + 1
+        try:
+            yield conn.cursor()
+            if outermost:
+                conn.commit()
+        except BaseException:
+            if outermost:
+                conn.rollback()
+            raise
+        finally:
+            local.tx_depth -= 1
+
+
+def close_connections():
+    """Close idle pooled connections (e.g. before moving the database file)."""
+    _pool.close_all()
+
+
+class WriteBehindQueue:
+    """
+    Single writer thread that applies deferred writes in submission order.
+
+    Writes queued within ``flush_interval`` seconds of each other (up to
+    ``max_batch``) are applied in one transaction, so many small inserts cost
+    one commit. ``submit`` blocks once ``max_pending`` writes are waiting,
+    which bounds memory and slows producers down to the disk's pace.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_batch: int = 1000,
+                 max_pending: int = 10000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="eventguard-writer", daemon=True)
+        self._thread.start()
+
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, args=(), kwargs=None, timeout: float = None):
+        """Queue ``fn(*args, **kwargs)``; raises queue.Full if still full after timeout."""
+        self._queue.put((fn, args, kwargs or {}), timeout=timeout)
+
+    def flush(self):
+        """Block until every write submitted so far has been committed."""
+        self._queue.join()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with transaction():
+                    for fn, args, kwargs in batch:
+                        fn(*args, **kwargs)
+            except Exception as e:
+                # Apply individually so one bad write doesn't drop the batch;
+                # nothing may escape here or the writer thread dies with it
+                self.last_error = e
+                for fn, args, kwargs in batch:
+                    try:
+                        fn(*args, **kwargs)
+                    except Exception as e:
+                        self.last_error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+_write_behind = None
+
+
+def enable_write_behind(flush_interval: float = 0.5, max_batch: int = 1000,
+                        max_pending: int = 10000) -> WriteBehindQueue:
+    """Start the write-behind queue (once per process) and return it."""
+    global _write_behind
+    if _write_behind is None:
+        _write_behind = WriteBehindQueue(flush_interval, max_batch, max_pending)
+        atexit.register(_write_behind.flush)
+    return _write_behind
+
+
+def flush_writes():
+    """Wait for queued write-behind writes to be committed; no-op when disabled."""
+    if _write_behind is not None:
+        _write_behind.flush()
+
+
+def _deferrable(fn):
+    """
+    Route a non-critical write through the write-behind queue when it is
+    enabled. Calls made inside an open transaction() still run inline so they
+    stay part of that transaction. Deferred calls return None.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        wb = _write_behind
+        if wb is None or wb.is_writer_thread() or getattr(_pool._local, "tx_depth", 0):
+            return fn(*args, **kwargs)
+        wb.submit(fn, args, kwargs)
+        return None
+    return wrapper
+
+
+# Schema migrations. Each entry runs exactly once per database, in order, and
+# is recorded in schema_version. Migrations should stay additive (new tables,
+# ADD COLUMN, CREATE INDEX) so large existing databases are never rewritten.
+def _migrate_base_schema(cur):
     # Create tables
     cur.execute(
         """
@@ -174,93 +408,482 @@ def init_db():
         );
         """
     )
-    
-    # Add new columns to existing incidents table if they don't exist
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN severity TEXT DEFAULT 'medium'")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN description TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN reporter_name TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN reporter_contact TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN status TEXT DEFAULT 'open'")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN priority TEXT DEFAULT 'normal'")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    try:
-        cur.execute("ALTER TABLE incidents ADD COLUMN additional_notes TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    conn.commit()
-    conn.close()
 
+    # Databases created before these incidents columns existed
+    for column, decl in (
+        ("severity", "TEXT DEFAULT 'medium'"),
+        ("description", "TEXT"),
+        ("reporter_name", "TEXT"),
+        ("reporter_contact", "TEXT"),
+        ("status", "TEXT DEFAULT 'open'"),
+        ("priority", "TEXT DEFAULT 'normal'"),
+        ("additional_notes", "TEXT"),
+    ):
+        _add_column_if_missing(cur, "incidents", column, decl)
 
-def create_user(email: str, hashed_password: bytes):
-    conn = get_conn()
-    cur = conn.cursor()
+
+def _add_column_if_missing(cur, table: str, column: str, decl: str):
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in {row["name"] for row in cur.fetchall()}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _create_indexes(cur):
+    # Secondary indexes for the hot list_* access paths
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_geo_alerts_created_at
+           ON geo_alerts (created_at)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_geo_alerts_unresolved_created_at
+           ON geo_alerts (created_at) WHERE is_resolved = 0"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_lost_found_reports_status
+           ON lost_found_reports (status, id)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_venue_blueprints_event
+           ON venue_blueprints (event_id, is_active, uploaded_at)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_events_organizer
+           ON events (organizer_id, id)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_zones_active_created_at
+           ON zones (is_active, created_at)"""
+    )
+
+
+def _create_density_store(cur):
+    # Hot tail of recent samples; closed windows are packed into density_blocks
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS density_samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            zone TEXT NOT NULL,
+            ts REAL NOT NULL,
+            density REAL NOT NULL,
+            velocity REAL,
+            source TEXT NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_density_samples_zone_ts
+           ON density_samples (zone, ts)"""
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS density_blocks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            zone TEXT NOT NULL,
+            source TEXT NOT NULL,
+            window_start REAL NOT NULL,
+            sample_count INTEGER NOT NULL,
+            density_sum REAL NOT NULL,
+            density_max REAL NOT NULL,
+            velocity_sum REAL NOT NULL,
+            velocity_count INTEGER NOT NULL,
+            ts_data BLOB NOT NULL,
+            density_data BLOB NOT NULL,
+            velocity_data BLOB NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_density_blocks_zone_window
+           ON density_blocks (zone, window_start)"""
+    )
+
+
+def _create_rollup_tables(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS alert_rollups (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            zone TEXT NOT NULL,
+            risk_level TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            PRIMARY KEY (granularity, bucket_start, zone, risk_level)
+        );
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geo_alert_rollups (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            zone_id INTEGER NOT NULL,
+            alert_type TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            PRIMARY KEY (granularity, bucket_start, zone_id, alert_type, severity)
+        );
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS incident_rollups (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            type TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            PRIMARY KEY (granularity, bucket_start, type, severity)
+        );
+        """
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_alerts_prediction_time
+           ON alerts (prediction_time)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_incidents_timestamp
+           ON incidents (timestamp)"""
+    )
+
+
+_COUNTER_BUMP = """INSERT INTO stat_counters (metric, key, value) VALUES ('{metric}', {key}, {delta})
+                   ON CONFLICT (metric, key) DO UPDATE SET value = value + ({delta});"""
+
+
+def _create_stat_counters(cur):
+    # Counters kept current by triggers so dashboard totals are O(1) reads
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            metric TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, key)
+        );
+        """
+    )
+    bump = _COUNTER_BUMP
+    triggers = {
+        "trg_alerts_count_insert": (
+            "AFTER INSERT ON alerts",
+            bump.format(metric="alerts", key="''", delta=1),
+        ),
+        "trg_alerts_count_delete": (
+            "AFTER DELETE ON alerts",
+            bump.format(metric="alerts", key="''", delta=-1),
+        ),
+        "trg_geo_alerts_count_insert": (
+            "AFTER INSERT ON geo_alerts WHEN NEW.is_resolved = 0",
+            bump.format(metric="geo_alerts_unresolved", key="NEW.severity", delta=1),
+        ),
+        "trg_geo_alerts_count_resolve": (
+            "AFTER UPDATE OF is_resolved ON geo_alerts WHEN OLD.is_resolved = 0 AND NEW.is_resolved != 0",
+            bump.format(metric="geo_alerts_unresolved", key="OLD.severity", delta=-1),
+        ),
+        "trg_geo_alerts_count_delete": (
+            "AFTER DELETE ON geo_alerts WHEN OLD.is_resolved = 0",
+            bump.format(metric="geo_alerts_unresolved", key="OLD.severity", delta=-1),
+        ),
+        "trg_incidents_count_insert": (
+            "AFTER INSERT ON incidents",
+            bump.format(metric="incidents_by_status", key="COALESCE(NEW.status, 'open')", delta=1),
+        ),
+        "trg_incidents_count_status": (
+            "AFTER UPDATE OF status ON incidents",
+            bump.format(metric="incidents_by_status", key="COALESCE(OLD.status, 'open')", delta=-1)
+            + bump.format(metric="incidents_by_status", key="COALESCE(NEW.status, 'open')", delta=1),
+        ),
+        "trg_incidents_count_delete": (
+            "AFTER DELETE ON incidents",
+            bump.format(metric="incidents_by_status", key="COALESCE(OLD.status, 'open')", delta=-1),
+        ),
+    }
+    for name, (when, body) in triggers.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {when} BEGIN {body} END")
+
+    # Seed from existing rows
+    cur.execute("DELETE FROM stat_counters")
+    cur.execute("INSERT INTO stat_counters SELECT 'alerts', '', COUNT(*) FROM alerts")
+    cur.execute(
+        """INSERT INTO stat_counters SELECT 'geo_alerts_unresolved', severity, COUNT(*)
+           FROM geo_alerts WHERE is_resolved = 0 GROUP BY severity"""
+    )
+    cur.execute(
+        """INSERT INTO stat_counters SELECT 'incidents_by_status', COALESCE(status, 'open'), COUNT(*)
+           FROM incidents GROUP BY 2"""
+    )
+
+
+# Full-text search indexes: external-content FTS5 tables kept in sync with
+# their source tables by triggers, searched by bm25 rank.
+FTS_INDEXES = {
+    "incidents_fts": ("incidents", ("type", "location", "description", "additional_notes")),
+    "lost_found_fts": ("lost_found_reports", ("person_name", "person_description",
+                                              "last_seen_location", "additional_details",
+                                              "commander_notes")),
+}
+
+
+def _create_fts_indexes(cur):
+    for fts, (table, columns) in FTS_INDEXES.items():
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        try:
+            cur.execute(
+                f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                        {cols}, content='{table}', content_rowid='id',
+                        tokenize='porter unicode61'
+                    )"""
+            )
+        except sqlite3.OperationalError:
+            return  # SQLite built without FTS5; searches fall back to LIKE
+        cur.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+                END"""
+        )
+        cur.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                END"""
+        )
+        cur.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                    INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+                END"""
+        )
+        cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _add_zone_shapes(cur):
+    # Polygon zones keep their vertices as a packed blob plus a bounding box;
+    # center/radius hold the enclosing circle so circle-only code still works.
+    for column, decl in (
+        ("shape", "TEXT NOT NULL DEFAULT 'circle'"),
+        ("vertices", "BLOB"),
+        ("bbox_south", "REAL"),
+        ("bbox_west", "REAL"),
+        ("bbox_north", "REAL"),
+        ("bbox_east", "REAL"),
+    ):
+        _add_column_if_missing(cur, "zones", column, decl)
+
+
+def _create_trajectory_store(cur):
+    # Same layout as the density store: a hot tail of raw points plus
+    # delta-encoded blocks per (entity, window)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS trajectory_points (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_trajectory_points_ts
+           ON trajectory_points (ts)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_trajectory_points_entity_ts
+           ON trajectory_points (entity_id, ts)"""
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS trajectory_blocks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity_id TEXT NOT NULL,
+            window_start REAL NOT NULL,
+            point_count INTEGER NOT NULL,
+            ts_start REAL NOT NULL,
+            lat_e7 INTEGER NOT NULL,
+            lng_e7 INTEGER NOT NULL,
+            deltas BLOB NOT NULL
+        );
+        """
+    )
     cur.execute(
-        "INSERT INTO users (email, hashed_password) VALUES (?, ?)",
-        (email.lower(), hashed_password),
+        """CREATE INDEX IF NOT EXISTS idx_trajectory_blocks_window
+           ON trajectory_blocks (window_start, entity_id)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_trajectory_blocks_entity_window
+           ON trajectory_blocks (entity_id, window_start)"""
+    )
+
+
+def _create_camera_registry(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cameras (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            source TEXT NOT NULL,
+            zone TEXT NOT NULL,
+            area_m2 REAL NOT NULL,
+            meters_per_pixel REAL NOT NULL,
+            frame_stride INTEGER NOT NULL DEFAULT 1,
+            is_active INTEGER DEFAULT 1,
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    # Cross-zone "latest readings" scans of the density tail and recent blocks
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_density_samples_ts
+           ON density_samples (ts)"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_density_blocks_window
+           ON density_blocks (window_start)"""
     )
-    conn.commit()
-    conn.close()
+
+
+def _keep_counters_through_retention(cur):
+    # Rows that retention rolls up, archives or deletes still count toward the
+    # dashboard totals. A retention batch holds a row in retention_pass while
+    # it deletes (inside its own transaction, so no other connection ever
+    # sees it) and the delete triggers skip those deletes.
+    cur.execute("CREATE TABLE IF NOT EXISTS retention_pass (active INTEGER NOT NULL)")
+    skip = "NOT EXISTS (SELECT 1 FROM retention_pass)"
+    triggers = {
+        "trg_alerts_count_delete": (
+            f"AFTER DELETE ON alerts WHEN {skip}",
+            _COUNTER_BUMP.format(metric="alerts", key="''", delta=-1),
+        ),
+        "trg_geo_alerts_count_delete": (
+            f"AFTER DELETE ON geo_alerts WHEN OLD.is_resolved = 0 AND {skip}",
+            _COUNTER_BUMP.format(metric="geo_alerts_unresolved", key="OLD.severity", delta=-1),
+        ),
+        "trg_incidents_count_delete": (
+            f"AFTER DELETE ON incidents WHEN {skip}",
+            _COUNTER_BUMP.format(metric="incidents_by_status", key="COALESCE(OLD.status, 'open')",
+                                 delta=-1),
+        ),
+    }
+    for name, (when, body) in triggers.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"CREATE TRIGGER {name} {when} BEGIN {body} END")
+
+    # Alerts pruned before this migration are still in the hourly rollups
+    cur.execute(
+        """INSERT INTO stat_counters (metric, key, value)
+           SELECT 'alerts', '', (SELECT COUNT(*) FROM alerts)
+               + (SELECT COALESCE(SUM(row_count), 0) FROM alert_rollups WHERE granularity = 'hour')
+           WHERE 1
+           ON CONFLICT (metric, key) DO UPDATE SET value = excluded.value"""
+    )
+
+
+MIGRATIONS = [
+    (1, "base schema", _migrate_base_schema),
+    (2, "indexes for list queries", _create_indexes),
+    (3, "density time-series store", _create_density_store),
+    (4, "retention rollup tables", _create_rollup_tables),
+    (5, "trigger-maintained stat counters", _create_stat_counters),
+    (6, "full-text search indexes", _create_fts_indexes),
+    (7, "polygon zones", _add_zone_shapes),
+    (8, "trajectory history store", _create_trajectory_store),
+    (9, "camera registry", _create_camera_registry),
+    (10, "stat counters survive retention", _keep_counters_through_retention),
+]
+
+
+def get_schema_version() -> int:
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        except sqlite3.OperationalError:
+            return 0  # schema_version not created yet
+        return cur.fetchone()[0]
+
+
+def init_db():
+    """
+    Apply pending migrations. When the database is already current this is a
+    single indexed read, so calling it on every start is cheap.
+    """
+    latest = MIGRATIONS[-1][0]
+    if get_schema_version() >= latest:
+        return
+    with transaction() as cur:
+        cur.execute(
+            """CREATE TABLE IF NOT EXISTS schema_version (
+                   version INTEGER PRIMARY KEY,
+                   description TEXT NOT NULL,
+                   applied_at TEXT NOT NULL
+               )"""
+        )
+    for version, description, migrate in MIGRATIONS:
+        # BEGIN IMMEDIATE takes the write lock up front, so processes starting
+        # together apply each migration only once.
+        with transaction() as cur:
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+            if cur.fetchone():
+                continue
+            migrate(cur)
+            cur.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.utcnow().isoformat()),
+            )
+
+
+def _iter_pages(list_fn, page_size: int, cursor_of, **filters):
+    """
+    Generator over a keyset-paginated list_* function. Only one page is held
+    in memory and each page is an index range scan, so cost per page is
+    constant regardless of table size.
+    """
+    cursor = {}
+    while True:
+        rows = list_fn(limit=page_size, **filters, **cursor)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        cursor = cursor_of(rows[-1])
+
+
+def create_user(email: str, hashed_password: bytes):
+    with transaction() as cur:
+        cur.execute(
+            "INSERT INTO users (email, hashed_password) VALUES (?, ?)",
+            (email.lower(), hashed_password),
+        )
 
 
 def get_user_by_email(email: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE email = ?", (email.lower(),))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM users WHERE email = ?", (email.lower(),))
+        return cur.fetchone()
 
 
 def save_otp(email: str, otp: str, expiry_minutes: int = 5):
     expiry = (datetime.utcnow() + timedelta(minutes=expiry_minutes)).isoformat()
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET otp = ?, otp_expiry = ? WHERE email = ?",
-        (otp, expiry, email.lower()),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            "UPDATE users SET otp = ?, otp_expiry = ? WHERE email = ?",
+            (otp, expiry, email.lower()),
+        )
 
 
 def clear_otp(email: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET otp = NULL, otp_expiry = NULL WHERE email = ?", (email.lower(),))
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute("UPDATE users SET otp = NULL, otp_expiry = NULL WHERE email = ?", (email.lower(),))
 
 
 def verify_otp(email: str, otp: str) -> bool:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT otp, otp_expiry FROM users WHERE email = ?", (email.lower(),))
-    row = cur.fetchone()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT otp, otp_expiry FROM users WHERE email = ?", (email.lower(),))
+        row = cur.fetchone()
     if not row:
         return False
     if not row["otp"] or not row["otp_expiry"]:
@@ -275,82 +898,86 @@ def verify_otp(email: str, otp: str) -> bool:
 
 
 def create_event(organizer_id: int, data: dict):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO events (organizer_id, event_name, goal, target_audience, date_time, venue_name, address, ticket_price, sponsors, description)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            organizer_id,
-            data.get("event_name"),
-            data.get("goal"),
-            data.get("target_audience"),
-            data.get("date_time"),
-            data.get("venue_name"),
-            data.get("address"),
-            data.get("ticket_price"),
-            data.get("sponsors"),
-            data.get("description"),
-        ),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            """
+            INSERT INTO events (organizer_id, event_name, goal, target_audience, date_time, venue_name, address, ticket_price, sponsors, description)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                organizer_id,
+                data.get("event_name"),
+                data.get("goal"),
+                data.get("target_audience"),
+                data.get("date_time"),
+                data.get("venue_name"),
+                data.get("address"),
+                data.get("ticket_price"),
+                data.get("sponsors"),
+                data.get("description"),
+            ),
+        )
 
 
 def list_events_by_user(user_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM events WHERE organizer_id = ? ORDER BY id DESC", (user_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM events WHERE organizer_id = ? ORDER BY id DESC", (user_id,))
+        return cur.fetchall()
 
 
 def add_incident(type_: str, location: str, unit_assigned: str = None, severity: str = "medium", 
                 description: str = None, reporter_name: str = None, reporter_contact: str = None,
                 priority: str = "normal", additional_notes: str = None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO incidents (type, location, timestamp, unit_assigned, severity, description, 
-           reporter_name, reporter_contact, priority, additional_notes) 
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (type_, location, datetime.utcnow().isoformat(), unit_assigned, severity, description,
-         reporter_name, reporter_contact, priority, additional_notes),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO incidents (type, location, timestamp, unit_assigned, severity, description, 
+               reporter_name, reporter_contact, priority, additional_notes) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (type_, location, datetime.utcnow().isoformat(), unit_assigned, severity, description,
+             reporter_name, reporter_contact, priority, additional_notes),
+        )
 
 
-def list_incidents(limit: int = 50):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM incidents ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+def list_incidents(limit: int = 50, before_id: int = None):
+    """Newest incidents first; pass the last row's id as before_id for the next page."""
+    with connection() as conn:
+        cur = conn.cursor()
+        if before_id is not None:
+            cur.execute("SELECT * FROM incidents WHERE id < ? ORDER BY id DESC LIMIT ?", (before_id, limit))
+        else:
+            cur.execute("SELECT * FROM incidents ORDER BY id DESC LIMIT ?", (limit,))
+        return cur.fetchall()
 
 
+def iter_incidents(page_size: int = 500):
+    """Yield every incident, newest first, one keyset page at a time."""
+    return _iter_pages(list_incidents, page_size, lambda row: {"before_id": row["id"]})
+
+
+@_deferrable
 def add_alert(zone: str, risk_level: str, prediction_time: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO alerts (zone, risk_level, prediction_time) VALUES (?, ?, ?)",
-        (zone, risk_level, prediction_time),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            "INSERT INTO alerts (zone, risk_level, prediction_time) VALUES (?, ?, ?)",
+            (zone, risk_level, prediction_time),
+        )
 
 
-def list_alerts(limit: int = 50):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM alerts ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+def list_alerts(limit: int = 50, before_id: int = None):
+    """Newest alerts first; pass the last row's id as before_id for the next page."""
+    with connection() as conn:
+        cur = conn.cursor()
+        if before_id is not None:
+            cur.execute("SELECT * FROM alerts WHERE id < ? ORDER BY id DESC LIMIT ?", (before_id, limit))
+        else:
+            cur.execute("SELECT * FROM alerts ORDER BY id DESC LIMIT ?", (limit,))
+        return cur.fetchall()
+
+
+def iter_alerts(page_size: int = 500):
+    """Yield every predictive alert, newest first, one keyset page at a time."""
+    return _iter_pages(list_alerts, page_size, lambda row: {"before_id": row["id"]})
 
 
 def add_lost_found_report(report_type: str, person_name: str = None, person_age: int = None,
@@ -359,38 +986,49 @@ def add_lost_found_report(report_type: str, person_name: str = None, person_age:
                          reporter_name: str = None, reporter_contact: str = None,
                          additional_details: str = None, media_files: str = None,
                          commander_notes: str = None, ai_detection_results: str = None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO lost_found_reports (report_type, person_name, person_age, person_gender,
-           person_description, last_seen_location, last_seen_time, reporter_name, reporter_contact,
-           additional_details, media_files, commander_notes, ai_detection_results, timestamp)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (report_type, person_name, person_age, person_gender, person_description,
-         last_seen_location, last_seen_time, reporter_name, reporter_contact,
-         additional_details, media_files, commander_notes, ai_detection_results,
-         datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    conn.close()
-
-
-def list_lost_found_reports(limit: int = 50, status: str = None):
-    conn = get_conn()
-    cur = conn.cursor()
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO lost_found_reports (report_type, person_name, person_age, person_gender,
+               person_description, last_seen_location, last_seen_time, reporter_name, reporter_contact,
+               additional_details, media_files, commander_notes, ai_detection_results, timestamp)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (report_type, person_name, person_age, person_gender, person_description,
+             last_seen_location, last_seen_time, reporter_name, reporter_contact,
+             additional_details, media_files, commander_notes, ai_detection_results,
+             datetime.utcnow().isoformat()),
+        )
+
+
+def list_lost_found_reports(limit: int = 50, status: str = None, report_type: str = None,
+                            before_id: int = None):
+    """Newest reports first; pass the last row's id as before_id for the next page."""
+    conditions = []
+    params = []
     if status:
-        cur.execute("SELECT * FROM lost_found_reports WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit))
-    else:
-        cur.execute("SELECT * FROM lost_found_reports ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+        conditions.append("status = ?")
+        params.append(status)
+    if report_type:
+        conditions.append("report_type = ?")
+        params.append(report_type)
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit)
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT * FROM lost_found_reports {where} ORDER BY id DESC LIMIT ?", params)
+        return cur.fetchall()
+
+
+def iter_lost_found_reports(page_size: int = 500, status: str = None, report_type: str = None):
+    """Yield matching reports, newest first, one keyset page at a time."""
+    return _iter_pages(list_lost_found_reports, page_size, lambda row: {"before_id": row["id"]},
+                       status=status, report_type=report_type)
 
 
 def update_lost_found_report(report_id: int, commander_notes: str = None, 
                            ai_detection_results: str = None, status: str = None):
-    conn = get_conn()
-    cur = conn.cursor()
     updates = []
     params = []
     
@@ -407,137 +1045,237 @@ def update_lost_found_report(report_id: int, commander_notes: str = None,
     if updates:
         params.append(report_id)
         query = f"UPDATE lost_found_reports SET {', '.join(updates)} WHERE id = ?"
-        cur.execute(query, params)
-        conn.commit()
-    conn.close()
+        with transaction() as cur:
+            cur.execute(query, params)
 
 
 # Geo-fencing functions
 def create_zone(name: str, zone_type: str, center_lat: float, center_lng: float, 
                 radius_meters: float, description: str = None, density_threshold: int = 100):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO zones (name, zone_type, center_lat, center_lng, radius_meters, 
-           description, density_threshold, created_at)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (name, zone_type, center_lat, center_lng, radius_meters, description, 
-         density_threshold, datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO zones (name, zone_type, center_lat, center_lng, radius_meters, 
+               description, density_threshold, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (name, zone_type, center_lat, center_lng, radius_meters, description, 
+             density_threshold, datetime.utcnow().isoformat()),
+        )
+
+
+def pack_vertices(vertices) -> bytes:
+    """Pack (lat, lng) pairs as interleaved native float64 values."""
+    return array("d", (c for lat, lng in vertices for c in (float(lat), float(lng)))).tobytes()
+
+
+def unpack_vertices(blob: bytes) -> list:
+    coords = array("d")
+    coords.frombytes(blob)
+    return list(zip(coords[0::2], coords[1::2]))
+
+
+def create_polygon_zone(name: str, zone_type: str, vertices: list, description: str = None,
+                        density_threshold: int = 100):
+    """
+    Create a polygon zone from a list of (lat, lng) vertices (at least three,
+    open or closed ring). The vertex centroid and the distance to the
+    farthest vertex are stored as the zone's center and radius.
+    """
+    vertices = [(float(lat), float(lng)) for lat, lng in vertices]
+    if len(vertices) > 1 and vertices[0] == vertices[-1]:
+        vertices = vertices[:-1]
+    if len(vertices) < 3:
+        raise ValueError("A polygon zone needs at least three vertices")
+    lats = [lat for lat, _ in vertices]
+    lngs = [lng for _, lng in vertices]
+    center_lat = sum(lats) / len(lats)
+    center_lng = sum(lngs) / len(lngs)
+    radius = max(haversine_m(center_lat, center_lng, lat, lng) for lat, lng in vertices)
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO zones (name, zone_type, center_lat, center_lng, radius_meters,
+               description, density_threshold, created_at, shape, vertices,
+               bbox_south, bbox_west, bbox_north, bbox_east)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'polygon', ?, ?, ?, ?, ?)""",
+            (name, zone_type, center_lat, center_lng, radius, description, density_threshold,
+             datetime.utcnow().isoformat(), pack_vertices(vertices),
+             min(lats), min(lngs), max(lats), max(lngs)),
+        )
 
 
 def list_zones(active_only: bool = True):
-    conn = get_conn()
-    cur = conn.cursor()
-    if active_only:
-        cur.execute("SELECT * FROM zones WHERE is_active = 1 ORDER BY created_at DESC")
-    else:
-        cur.execute("SELECT * FROM zones ORDER BY created_at DESC")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        if active_only:
+            cur.execute("SELECT * FROM zones WHERE is_active = 1 ORDER BY created_at DESC")
+        else:
+            cur.execute("SELECT * FROM zones ORDER BY created_at DESC")
+        return cur.fetchall()
 
 
 def get_zone_by_id(zone_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM zones WHERE id = ?", (zone_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM zones WHERE id = ?", (zone_id,))
+        return cur.fetchone()
 
 
+@_deferrable
 def add_geo_alert(zone_id: int, alert_type: str, entity_id: str = None, 
                  entity_lat: float = None, entity_lng: float = None, 
                  message: str = "", severity: str = "medium"):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO geo_alerts (zone_id, alert_type, entity_id, entity_lat, 
-           entity_lng, message, severity, created_at)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (zone_id, alert_type, entity_id, entity_lat, entity_lng, message, 
-         severity, datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    conn.close()
-
-
-def list_geo_alerts(limit: int = 50, unresolved_only: bool = True):
-    conn = get_conn()
-    cur = conn.cursor()
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO geo_alerts (zone_id, alert_type, entity_id, entity_lat, 
+               entity_lng, message, severity, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (zone_id, alert_type, entity_id, entity_lat, entity_lng, message, 
+             severity, datetime.utcnow().isoformat()),
+        )
+
+
+@_deferrable
+def add_geo_alerts_bulk(alerts: list):
+    """
+    Insert many geo alerts (dicts shaped like generate_zone_alerts output) in
+    one transaction. Returns the number of rows written, or None when the
+    call is deferred to the write-behind queue.
+    """
+    now = datetime.utcnow().isoformat()
+    rows = [
+        (a['zone_id'], a['alert_type'], a.get('entity_id'), a.get('entity_lat'),
+         a.get('entity_lng'), a.get('message', ""), a.get('severity', "medium"), now)
+        for a in alerts
+    ]
+    if not rows:
+        return 0
+    with transaction() as cur:
+        cur.executemany(
+            """INSERT INTO geo_alerts (zone_id, alert_type, entity_id, entity_lat, 
+               entity_lng, message, severity, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+    return len(rows)
+
+
+def list_geo_alerts(limit: int = 50, unresolved_only: bool = True,
+                    before_ts: str = None, before_id: int = None):
+    """
+    Newest geo alerts first. For the next page pass the last row's created_at
+    and id as before_ts/before_id.
+    """
+    conditions = []
+    params = []
     if unresolved_only:
-        cur.execute("""SELECT ga.*, z.name as zone_name, z.zone_type 
-                      FROM geo_alerts ga 
-                      JOIN zones z ON ga.zone_id = z.id 
-                      WHERE ga.is_resolved = 0 
-                      ORDER BY ga.created_at DESC LIMIT ?""", (limit,))
-    else:
-        cur.execute("""SELECT ga.*, z.name as zone_name, z.zone_type 
-                      FROM geo_alerts ga 
-                      JOIN zones z ON ga.zone_id = z.id 
-                      ORDER BY ga.created_at DESC LIMIT ?""", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+        conditions.append("ga.is_resolved = 0")
+    if before_ts is not None:
+        conditions.append("(ga.created_at, ga.id) < (?, ?)")
+        params.extend([before_ts, before_id if before_id is not None else -1])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit)
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""SELECT ga.*, z.name as zone_name, z.zone_type 
+                       FROM geo_alerts ga 
+                       JOIN zones z ON ga.zone_id = z.id 
+                       {where}
+                       ORDER BY ga.created_at DESC, ga.id DESC LIMIT ?""", params)
+        return cur.fetchall()
+
+
+def iter_geo_alerts(page_size: int = 500, unresolved_only: bool = True):
+    """Yield geo alerts, newest first, one keyset page at a time."""
+    return _iter_pages(list_geo_alerts, page_size,
+                       lambda row: {"before_ts": row["created_at"], "before_id": row["id"]},
+                       unresolved_only=unresolved_only)
 
 
 def resolve_geo_alert(alert_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE geo_alerts SET is_resolved = 1, resolved_at = ? WHERE id = ?",
-        (datetime.utcnow().isoformat(), alert_id),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            "UPDATE geo_alerts SET is_resolved = 1, resolved_at = ? WHERE id = ?",
+            (datetime.utcnow().isoformat(), alert_id),
+        )
 
 
 def add_tracking_entity(entity_id: str, name: str = None, entity_type: str = "person", 
                        lat: float = None, lng: float = None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT OR REPLACE INTO tracking_entities 
-           (id, name, entity_type, current_lat, current_lng, last_seen)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (entity_id, name, entity_type, lat, lng, datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            """INSERT OR REPLACE INTO tracking_entities 
+               (id, name, entity_type, current_lat, current_lng, last_seen)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (entity_id, name, entity_type, lat, lng, datetime.utcnow().isoformat()),
+        )
 
 
+@_deferrable
 def update_tracking_entity_location(entity_id: str, lat: float, lng: float):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """UPDATE tracking_entities 
-           SET current_lat = ?, current_lng = ?, last_seen = ?
-           WHERE id = ?""",
-        (lat, lng, datetime.utcnow().isoformat(), entity_id),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            """UPDATE tracking_entities 
+               SET current_lat = ?, current_lng = ?, last_seen = ?
+               WHERE id = ?""",
+            (lat, lng, datetime.utcnow().isoformat(), entity_id),
+        )
+
+
+def upsert_tracking_entities_bulk(entities: list):
+    """
+    Insert or replace many tracking entities (dicts with id, name, entity_type,
+    lat, lng) in one transaction. Returns the number of rows written.
+    """
+    now = datetime.utcnow().isoformat()
+    rows = [
+        (e['id'], e.get('name'), e.get('entity_type', "person"), e.get('lat'), e.get('lng'),
+         e.get('timestamp') or now)
+        for e in entities
+    ]
+    if not rows:
+        return 0
+    with transaction() as cur:
+        cur.executemany(
+            """INSERT OR REPLACE INTO tracking_entities 
+               (id, name, entity_type, current_lat, current_lng, last_seen)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+    return len(rows)
+
+
+@_deferrable
+def update_tracking_locations_bulk(entities: list):
+    """
+    Update the current position of many tracking entities (dicts with id, lat,
+    lng and optional timestamp) in one transaction. Returns the number of rows
+    submitted, or None when the call is deferred to the write-behind queue.
+    """
+    now = datetime.utcnow().isoformat()
+    rows = [(e['lat'], e['lng'], e.get('timestamp') or now, e['id']) for e in entities]
+    if not rows:
+        return 0
+    with transaction() as cur:
+        cur.executemany(
+            """UPDATE tracking_entities 
+               SET current_lat = ?, current_lng = ?, last_seen = ?
+               WHERE id = ?""",
+            rows,
+        )
+    return len(rows)
 
 
 def list_tracking_entities():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tracking_entities WHERE is_active = 1")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM tracking_entities WHERE is_active = 1")
+        return cur.fetchall()
 
 
 def get_entity_location(entity_id: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tracking_entities WHERE id = ?", (entity_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM tracking_entities WHERE id = ?", (entity_id,))
+        return cur.fetchone()
 
 
 # Blueprint management functions
@@ -547,67 +1285,745 @@ def add_blueprint(event_id: int, blueprint_name: str, file_path: str,
                  venue_bounds_north: float = None, venue_bounds_south: float = None,
                  venue_bounds_east: float = None, venue_bounds_west: float = None,
                  description: str = None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO venue_blueprints (event_id, blueprint_name, file_path, original_filename,
-           file_size, image_width, image_height, venue_bounds_north, venue_bounds_south,
-           venue_bounds_east, venue_bounds_west, description, uploaded_at)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (event_id, blueprint_name, file_path, original_filename, file_size, 
-         image_width, image_height, venue_bounds_north, venue_bounds_south,
-         venue_bounds_east, venue_bounds_west, description, datetime.utcnow().isoformat()),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO venue_blueprints (event_id, blueprint_name, file_path, original_filename,
+               file_size, image_width, image_height, venue_bounds_north, venue_bounds_south,
+               venue_bounds_east, venue_bounds_west, description, uploaded_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (event_id, blueprint_name, file_path, original_filename, file_size, 
+             image_width, image_height, venue_bounds_north, venue_bounds_south,
+             venue_bounds_east, venue_bounds_west, description, datetime.utcnow().isoformat()),
+        )
 
 
 def get_blueprint_by_event(event_id: int, active_only: bool = True):
-    conn = get_conn()
-    cur = conn.cursor()
-    if active_only:
-        cur.execute("SELECT * FROM venue_blueprints WHERE event_id = ? AND is_active = 1 ORDER BY uploaded_at DESC", (event_id,))
-    else:
-        cur.execute("SELECT * FROM venue_blueprints WHERE event_id = ? ORDER BY uploaded_at DESC", (event_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    with connection() as conn:
+        cur = conn.cursor()
+        if active_only:
+            cur.execute("SELECT * FROM venue_blueprints WHERE event_id = ? AND is_active = 1 ORDER BY uploaded_at DESC", (event_id,))
+        else:
+            cur.execute("SELECT * FROM venue_blueprints WHERE event_id = ? ORDER BY uploaded_at DESC", (event_id,))
+        return cur.fetchone()
 
 
 def list_blueprints_by_user(user_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""SELECT vb.*, e.event_name 
-                  FROM venue_blueprints vb 
-                  JOIN events e ON vb.event_id = e.id 
-                  WHERE e.organizer_id = ? AND vb.is_active = 1 
-                  ORDER BY vb.uploaded_at DESC""", (user_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""SELECT vb.*, e.event_name 
+                      FROM venue_blueprints vb 
+                      JOIN events e ON vb.event_id = e.id 
+                      WHERE e.organizer_id = ? AND vb.is_active = 1 
+                      ORDER BY vb.uploaded_at DESC""", (user_id,))
+        return cur.fetchall()
 
 
 def update_blueprint_bounds(blueprint_id: int, north: float, south: float, east: float, west: float):
-    conn = get_conn()
-    cur = conn.cursor()
+    with transaction() as cur:
+        cur.execute(
+            """UPDATE venue_blueprints 
+               SET venue_bounds_north = ?, venue_bounds_south = ?, 
+                   venue_bounds_east = ?, venue_bounds_west = ?
+               WHERE id = ?""",
+            (north, south, east, west, blueprint_id),
+        )
+
+
+def deactivate_blueprint(blueprint_id: int):
+    with transaction() as cur:
+        cur.execute("UPDATE venue_blueprints SET is_active = 0 WHERE id = ?", (blueprint_id,))
+
+
+# Camera registry
+def add_camera(name: str, source: str, zone: str, area_m2: float, meters_per_pixel: float,
+               frame_stride: int = 1):
+    """Register a camera (device index, RTSP/HTTP URL or file path) watching a density zone."""
+    with transaction() as cur:
+        cur.execute(
+            """INSERT INTO cameras (name, source, zone, area_m2, meters_per_pixel, frame_stride,
+               created_at) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (name, str(source), zone, float(area_m2), float(meters_per_pixel), int(frame_stride),
+             datetime.utcnow().isoformat()),
+        )
+
+
+def list_cameras(active_only: bool = True):
+    with connection() as conn:
+        cur = conn.cursor()
+        if active_only:
+            cur.execute("SELECT * FROM cameras WHERE is_active = 1 ORDER BY zone, name")
+        else:
+            cur.execute("SELECT * FROM cameras ORDER BY zone, name")
+        return cur.fetchall()
+
+
+def set_camera_active(camera_id: int, active: bool):
+    with transaction() as cur:
+        cur.execute("UPDATE cameras SET is_active = ? WHERE id = ?", (1 if active else 0, camera_id))
+
+
+def delete_camera(camera_id: int):
+    with transaction() as cur:
+        cur.execute("DELETE FROM cameras WHERE id = ?", (camera_id,))
+
+
+# Density time-series functions
+#
+# Samples are appended to density_samples. Once a zone's samples fall behind
+# the current DENSITY_BLOCK_SECONDS window they are packed into one
+# density_blocks row per (zone, source, window): timestamps as float64 and
+# density/velocity as float32 arrays, plus running aggregates so coarse
+# downsampling can skip decoding.
+DENSITY_BLOCK_SECONDS = 300
+
+
+def _window_start(ts: float) -> float:
+    return ts - (ts % DENSITY_BLOCK_SECONDS)
+
+
+@_deferrable
+def add_density_samples(zone: str, samples, source: str = "sim"):
+    """
+    Append (ts, density, velocity) samples for a zone; ts is epoch seconds and
+    velocity may be None. Returns the number of samples written, or None when
+    the call is deferred to the write-behind queue.
+    """
+    rows = [
+        (zone, float(ts), float(density), None if velocity is None else float(velocity), source)
+        for ts, density, velocity in samples
+    ]
+    if not rows:
+        return 0
+    with transaction() as cur:
+        cur.executemany(
+            "INSERT INTO density_samples (zone, ts, density, velocity, source) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        _compact_density_samples(cur, zone, _window_start(max(r[1] for r in rows)))
+    return len(rows)
+
+
+def add_density_sample(zone: str, density: float, velocity: float = None,
+                       source: str = "sim", ts: float = None):
+    return add_density_samples(zone, [(ts if ts is not None else time.time(), density, velocity)], source)
+
+
+def _compact_density_samples(cur, zone: str, before: float):
     cur.execute(
-        """UPDATE venue_blueprints 
-           SET venue_bounds_north = ?, venue_bounds_south = ?, 
-               venue_bounds_east = ?, venue_bounds_west = ?
-           WHERE id = ?""",
-        (north, south, east, west, blueprint_id),
+        """SELECT ts, density, velocity, source FROM density_samples
+           WHERE zone = ? AND ts < ? ORDER BY ts""",
+        (zone, before),
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return
+    windows = {}
+    for row in rows:
+        windows.setdefault((row["source"], _window_start(row["ts"])), []).append(row)
+    blocks = []
+    for (source, window_start), samples in windows.items():
+        velocities = [r["velocity"] for r in samples if r["velocity"] is not None]
+        blocks.append((
+            zone, source, window_start, len(samples),
+            sum(r["density"] for r in samples), max(r["density"] for r in samples),
+            sum(velocities), len(velocities),
+            array("d", (r["ts"] for r in samples)).tobytes(),
+            array("f", (r["density"] for r in samples)).tobytes(),
+            array("f", (float("nan") if r["velocity"] is None else r["velocity"] for r in samples)).tobytes(),
+        ))
+    cur.executemany(
+        """INSERT INTO density_blocks (zone, source, window_start, sample_count, density_sum,
+           density_max, velocity_sum, velocity_count, ts_data, density_data, velocity_data)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        blocks,
     )
-    conn.commit()
-    conn.close()
+    cur.execute("DELETE FROM density_samples WHERE zone = ? AND ts < ?", (zone, before))
 
 
-def deactivate_blueprint(blueprint_id: int):
+def _unpack_density_block(block):
+    ts = array("d")
+    ts.frombytes(block["ts_data"])
+    density = array("f")
+    density.frombytes(block["density_data"])
+    velocity = array("f")
+    velocity.frombytes(block["velocity_data"])
+    return [
+        (t, d, None if v != v else v)  # NaN marks a missing velocity
+        for t, d, v in zip(ts, density, velocity)
+    ]
+
+
+def _density_range_query(cur, zone: str, start_ts: float, end_ts: float, source: str = None):
+    source_clause = " AND source = ?" if source else ""
+    extra = (source,) if source else ()
+    cur.execute(
+        f"""SELECT * FROM density_blocks
+            WHERE zone = ? AND window_start > ? AND window_start < ?{source_clause}
+            ORDER BY window_start""",
+        (zone, start_ts - DENSITY_BLOCK_SECONDS, end_ts) + extra,
+    )
+    blocks = cur.fetchall()
+    cur.execute(
+        f"""SELECT ts, density, velocity FROM density_samples
+            WHERE zone = ? AND ts >= ? AND ts < ?{source_clause}
+            ORDER BY ts""",
+        (zone, start_ts, end_ts) + extra,
+    )
+    tail = [tuple(r) for r in cur.fetchall()]
+    return blocks, tail
+
+
+def list_density_samples(zone: str, start_ts: float = None, end_ts: float = None,
+                         source: str = None):
+    """
+    Return (ts, density, velocity) tuples for a zone in [start_ts, end_ts),
+    ordered by time. Defaults to the last hour.
+    """
+    end_ts = end_ts if end_ts is not None else time.time()
+    start_ts = start_ts if start_ts is not None else end_ts - 3600
+    with connection() as conn:
+        blocks, tail = _density_range_query(conn.cursor(), zone, start_ts, end_ts, source)
+    samples = []
+    for block in blocks:
+        samples.extend(s for s in _unpack_density_block(block) if start_ts <= s[0] < end_ts)
+    samples.extend(tail)
+    samples.sort(key=lambda s: s[0])
+    return samples
+
+
+def downsample_density_samples(zone: str, bucket_seconds: float = 60, start_ts: float = None,
+                               end_ts: float = None, source: str = None):
+    """
+    Aggregate a zone's samples into fixed time buckets. Returns a list of dicts
+    with bucket_start, density_mean, density_max, velocity_mean and count.
+    Blocks that fall entirely inside one bucket are read from their stored
+    aggregates without unpacking.
+    """
+    end_ts = end_ts if end_ts is not None else time.time()
+    start_ts = start_ts if start_ts is not None else end_ts - 3600
+    with connection() as conn:
+        blocks, tail = _density_range_query(conn.cursor(), zone, start_ts, end_ts, source)
+
+    buckets = {}
+
+    def bucket_for(ts):
+        key = ts - (ts % bucket_seconds)
+        if key not in buckets:
+            buckets[key] = {"count": 0, "density_sum": 0.0, "density_max": float("-inf"),
+                            "velocity_sum": 0.0, "velocity_count": 0}
+        return buckets[key]
+
+    def add(ts, density, velocity):
+        b = bucket_for(ts)
+        b["count"] += 1
+        b["density_sum"] += density
+        b["density_max"] = max(b["density_max"], density)
+        if velocity is not None:
+            b["velocity_sum"] += velocity
+            b["velocity_count"] += 1
+
+    for block in blocks:
+        ws = block["window_start"]
+        we = ws + DENSITY_BLOCK_SECONDS
+        same_bucket = (ws - ws % bucket_seconds) == ((we - 1e-9) - (we - 1e-9) % bucket_seconds)
+        if same_bucket and ws >= start_ts and we <= end_ts:
+            b = bucket_for(ws)
+            b["count"] += block["sample_count"]
+            b["density_sum"] += block["density_sum"]
+            b["density_max"] = max(b["density_max"], block["density_max"])
+            b["velocity_sum"] += block["velocity_sum"]
+            b["velocity_count"] += block["velocity_count"]
+            continue
+        for ts, density, velocity in _unpack_density_block(block):
+            if start_ts <= ts < end_ts:
+                add(ts, density, velocity)
+    for ts, density, velocity in tail:
+        add(ts, density, velocity)
+
+    return [
+        {
+            "bucket_start": key,
+            "density_mean": b["density_sum"] / b["count"],
+            "density_max": b["density_max"],
+            "velocity_mean": b["velocity_sum"] / b["velocity_count"] if b["velocity_count"] else None,
+            "count": b["count"],
+        }
+        for key, b in sorted(buckets.items())
+    ]
+
+
+def zone_density_summary(window_seconds: float = 60, source_prefix: str = "camera:",
+                         now: float = None):
+    """
+    Per-zone fan-in of recent samples from sources starting with
+    source_prefix: dicts with zone, sources (distinct sources), density_mean,
+    density_max, velocity_mean and last_ts over the last window_seconds,
+    ordered by zone. Any write to a zone compacts every source's samples from
+    before the current window, so recent samples may already sit in
+    density_blocks; both the tail and the blocks overlapping the window are
+    read.
+    """
+    now = now if now is not None else time.time()
+    since = now - window_seconds
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT * FROM density_blocks
+               WHERE window_start > ? AND source LIKE ? || '%'""",
+            (since - DENSITY_BLOCK_SECONDS, source_prefix),
+        )
+        blocks = cur.fetchall()
+        cur.execute(
+            """SELECT zone, source, ts, density, velocity FROM density_samples
+               WHERE ts >= ? AND source LIKE ? || '%'""",
+            (since, source_prefix),
+        )
+        tail = cur.fetchall()
+
+    zones = {}
+
+    def add(zone, source, ts, density, velocity):
+        z = zones.get(zone)
+        if z is None:
+            z = zones[zone] = {"sources": set(), "count": 0, "density_sum": 0.0,
+                               "density_max": float("-inf"), "velocity_sum": 0.0,
+                               "velocity_count": 0, "last_ts": ts}
+        z["sources"].add(source)
+        z["count"] += 1
+        z["density_sum"] += density
+        z["density_max"] = max(z["density_max"], density)
+        if velocity is not None:
+            z["velocity_sum"] += velocity
+            z["velocity_count"] += 1
+        z["last_ts"] = max(z["last_ts"], ts)
+
+    for block in blocks:
+        for ts, density, velocity in _unpack_density_block(block):
+            if ts >= since:
+                add(block["zone"], block["source"], ts, density, velocity)
+    for row in tail:
+        add(row["zone"], row["source"], row["ts"], row["density"], row["velocity"])
+
+    return [
+        {
+            "zone": zone,
+            "sources": len(z["sources"]),
+            "density_mean": z["density_sum"] / z["count"],
+            "density_max": z["density_max"],
+            "velocity_mean": z["velocity_sum"] / z["velocity_count"] if z["velocity_count"] else None,
+            "last_ts": z["last_ts"],
+        }
+        for zone, z in sorted(zones.items())
+    ]
+
+
+# Trajectory history
+#
+# Positions are appended to trajectory_points. Once they fall behind the
+# current TRAJECTORY_BLOCK_SECONDS window they are packed into one
+# trajectory_blocks row per (entity, window): the first point as epoch
+# seconds plus lat/lng in 1e-7 degree units (~1 cm), then every point as
+# int32 (ms, lat, lng) deltas from its predecessor -- 12 bytes a point.
+# History older than TRAJECTORY_RETENTION_SECONDS is dropped by
+# run_retention(), so storage stays bounded.
+TRAJECTORY_BLOCK_SECONDS = 300
+TRAJECTORY_RETENTION_SECONDS = 2 * 3600
+
+
+def _trajectory_window(ts: float) -> float:
+    return ts - (ts % TRAJECTORY_BLOCK_SECONDS)
+
+
+@_deferrable
+def add_trajectory_points(points):
+    """
+    Append (entity_id, ts, lat, lng) positions; ts is epoch seconds. Returns
+    the number of points written, or None when the call is deferred to the
+    write-behind queue.
+    """
+    rows = [(str(e), float(ts), float(lat), float(lng)) for e, ts, lat, lng in points]
+    if not rows:
+        return 0
+    with transaction() as cur:
+        cur.executemany(
+            "INSERT INTO trajectory_points (entity_id, ts, lat, lng) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        _compact_trajectory_points(cur, _trajectory_window(max(r[1] for r in rows)))
+    return len(rows)
+
+
+def _compact_trajectory_points(cur, before: float):
+    cur.execute(
+        """SELECT entity_id, ts, lat, lng FROM trajectory_points
+           WHERE ts < ? ORDER BY entity_id, ts""",
+        (before,),
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return
+    windows = {}
+    for row in rows:
+        windows.setdefault((row["entity_id"], _trajectory_window(row["ts"])), []).append(row)
+    blocks = []
+    for (entity_id, window_start), points in windows.items():
+        ms = [round(p["ts"] * 1000) for p in points]
+        lat = [round(p["lat"] * 1e7) for p in points]
+        lng = [round(p["lng"] * 1e7) for p in points]
+        deltas = array("i")
+        for i in range(len(points)):
+            j = i - 1 if i else 0
+            deltas.extend((ms[i] - ms[j], lat[i] - lat[j], lng[i] - lng[j]))
+        blocks.append((entity_id, window_start, len(points), ms[0] / 1000, lat[0], lng[0],
+                       deltas.tobytes()))
+    cur.executemany(
+        """INSERT INTO trajectory_blocks (entity_id, window_start, point_count, ts_start,
+           lat_e7, lng_e7, deltas) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        blocks,
+    )
+    cur.execute("DELETE FROM trajectory_points WHERE ts < ?", (before,))
+
+
+def _unpack_trajectory_block(block):
+    deltas = array("i")
+    deltas.frombytes(block["deltas"])
+    # The first point's deltas are zero, so running sums are offsets from it
+    ms0, lat0, lng0 = round(block["ts_start"] * 1000), block["lat_e7"], block["lng_e7"]
+    return [
+        ((ms0 + t) / 1000, (lat0 + a) / 1e7, (lng0 + b) / 1e7)
+        for t, a, b in zip(accumulate(deltas[0::3]), accumulate(deltas[1::3]), accumulate(deltas[2::3]))
+    ]
+
+
+def list_trajectories(start_ts: float = None, end_ts: float = None, entity_ids=None):
+    """
+    Return {entity_id: [(ts, lat, lng), ...]} for positions in
+    [start_ts, end_ts), each track ordered by time. Defaults to the last
+    hour of every entity.
+    """
+    end_ts = end_ts if end_ts is not None else time.time()
+    start_ts = start_ts if start_ts is not None else end_ts - 3600
+    entity_clause, extra = "", ()
+    if entity_ids is not None:
+        entity_ids = [str(e) for e in entity_ids]
+        if not entity_ids:
+            return {}
+        entity_clause = f" AND entity_id IN ({', '.join('?' * len(entity_ids))})"
+        extra = tuple(entity_ids)
+    tracks = {}
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""SELECT * FROM trajectory_blocks
+                WHERE window_start > ? AND window_start < ?{entity_clause}
+                ORDER BY window_start""",
+            (start_ts - TRAJECTORY_BLOCK_SECONDS, end_ts) + extra,
+        )
+        for block in cur.fetchall():
+            tracks.setdefault(block["entity_id"], []).extend(
+                p for p in _unpack_trajectory_block(block) if start_ts <= p[0] < end_ts
+            )
+        cur.execute(
+            f"""SELECT entity_id, ts, lat, lng FROM trajectory_points
+                WHERE ts >= ? AND ts < ?{entity_clause}
+                ORDER BY ts""",
+            (start_ts, end_ts) + extra,
+        )
+        for row in cur.fetchall():
+            tracks.setdefault(row["entity_id"], []).append((row["ts"], row["lat"], row["lng"]))
+    for track in tracks.values():
+        track.sort(key=lambda p: p[0])
+    return tracks
+
+
+def list_trajectory(entity_id: str, start_ts: float = None, end_ts: float = None):
+    """(ts, lat, lng) positions of one entity in [start_ts, end_ts), oldest first."""
+    return list_trajectories(start_ts, end_ts, [entity_id]).get(str(entity_id), [])
+
+
+def prune_trajectories(now: float = None) -> int:
+    """Drop trajectory history older than TRAJECTORY_RETENTION_SECONDS. Returns rows removed."""
+    cutoff = (now if now is not None else time.time()) - TRAJECTORY_RETENTION_SECONDS
+    with transaction() as cur:
+        cur.execute("DELETE FROM trajectory_blocks WHERE window_start <= ? - ?",
+                    (cutoff, TRAJECTORY_BLOCK_SECONDS))
+        removed = cur.rowcount
+        cur.execute("DELETE FROM trajectory_points WHERE ts < ?", (cutoff,))
+        return removed + cur.rowcount
+
+
+# Retention, rollup and archival
+#
+# Rows older than their table's retention window leave the live table in
+# batches: each batch is counted into per-minute and per-hour rollup tables
+# and then either deleted (alerts) or moved to the archive database
+# (resolved geo alerts, resolved/closed incidents). A row is counted in the
+# rollups exactly once, when it leaves the live table.
+RetentionPolicy = namedtuple(
+    "RetentionPolicy", "table time_column condition rollup_table rollup_keys archive"
+)
+RETENTION_POLICIES = (
+    RetentionPolicy("alerts", "prediction_time", "1 = 1", "alert_rollups",
+                    (("zone", "zone"), ("risk_level", "risk_level")), archive=False),
+    RetentionPolicy("geo_alerts", "created_at", "is_resolved = 1", "geo_alert_rollups",
+                    (("zone_id", "zone_id"), ("alert_type", "alert_type"), ("severity", "severity")),
+                    archive=True),
+    RetentionPolicy("incidents", "timestamp", "status IN ('resolved', 'closed')", "incident_rollups",
+                    (("type", "type"), ("severity", "COALESCE(severity, 'medium')")), archive=True),
+)
+RETENTION_HOURS = {"alerts": 6, "geo_alerts": 6, "incidents": 72}
+MINUTE_ROLLUP_RETENTION_HOURS = 48
+RETENTION_BATCH_SIZE = 5000
+
+# ISO-8601 prefix lengths: "YYYY-MM-DDTHH:MM" and "YYYY-MM-DDTHH"
+_ROLLUP_GRANULARITIES = (("minute", 16), ("hour", 13))
+
+_retention_thread = None
+_retention_lock = threading.Lock()
+
+
+def _retention_batch(cur, policy: RetentionPolicy, cutoff: str, batch_size: int) -> int:
+    table, time_col = policy.table, policy.time_column
+    cur.execute(
+        f"""SELECT MAX(id) AS max_id, COUNT(*) AS n FROM (
+                SELECT id FROM {table} WHERE {time_col} < ? AND {policy.condition}
+                ORDER BY id LIMIT ?
+            )""",
+        (cutoff, batch_size),
+    )
+    row = cur.fetchone()
+    if not row["n"]:
+        return 0
+    where = f"{time_col} < ? AND {policy.condition} AND id <= ?"
+    params = (cutoff, row["max_id"])
+
+    key_cols = ", ".join(col for col, _ in policy.rollup_keys)
+    key_exprs = ", ".join(expr for _, expr in policy.rollup_keys)
+    group_by = ", ".join(str(i) for i in range(3, 3 + len(policy.rollup_keys)))
+    for granularity, prefix in _ROLLUP_GRANULARITIES:
+        cur.execute(
+            f"""INSERT INTO {policy.rollup_table} (granularity, bucket_start, {key_cols}, row_count)
+                SELECT ?, substr({time_col}, 1, {prefix}), {key_exprs}, COUNT(*)
+                FROM {table} WHERE {where}
+                GROUP BY 2, {group_by}
+                ON CONFLICT DO UPDATE SET row_count = row_count + excluded.row_count""",
+            (granularity,) + params,
+        )
+    if policy.archive:
+        cur.execute(f"INSERT INTO archive.{table} SELECT * FROM main.{table} WHERE {where}", params)
+    # Rolled-up rows keep counting toward the dashboard totals
+    cur.execute("INSERT INTO retention_pass (active) VALUES (1)")
+    cur.execute(f"DELETE FROM {table} WHERE {where}", params)
+    cur.execute("DELETE FROM retention_pass")
+    return row["n"]
+
+
+def run_retention(now: datetime = None, batch_size: int = RETENTION_BATCH_SIZE,
+                  max_batches: int = None) -> dict:
+    """
+    Roll up and remove aged rows from the live tables, one short transaction
+    per batch so the app's writers are never blocked for long. Returns the
+    number of rows removed per table.
+    """
+    now = now or datetime.utcnow()
+    removed = {}
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE venue_blueprints SET is_active = 0 WHERE id = ?", (blueprint_id,))
-    conn.commit()
-    conn.close()
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+        for policy in RETENTION_POLICIES:
+            if policy.archive:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS archive.{policy.table} "
+                    f"AS SELECT * FROM main.{policy.table} WHERE 0"
+                )
+        for policy in RETENTION_POLICIES:
+            table = policy.table
+            cutoff = (now - timedelta(hours=RETENTION_HOURS[table])).isoformat()
+            removed[table] = 0
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                with conn:
+                    n = _retention_batch(conn.cursor(), policy, cutoff, batch_size)
+                removed[table] += n
+                batches += 1
+                if n < batch_size:
+                    break
+
+        removed["trajectories"] = prune_trajectories(now.replace(tzinfo=timezone.utc).timestamp())
+
+        minute_cutoff = (now - timedelta(hours=MINUTE_ROLLUP_RETENTION_HOURS)).isoformat()[:16]
+        with conn:
+            for policy in RETENTION_POLICIES:
+                conn.execute(
+                    f"DELETE FROM {policy.rollup_table} WHERE granularity = 'minute' AND bucket_start < ?",
+                    (minute_cutoff,),
+                )
+    finally:
+        conn.close()
+    return removed
+
+
+def start_retention_worker(interval_seconds: float = 300):
+    """Run run_retention() every interval on a daemon thread (once per process)."""
+    global _retention_thread
+    with _retention_lock:
+        if _retention_thread is not None and _retention_thread.is_alive():
+            return _retention_thread
+
+        def _loop():
+            while True:
+                try:
+                    run_retention(max_batches=20)
+                except sqlite3.Error:
+                    pass  # Retried on the next interval
+                time.sleep(interval_seconds)
+
+        _retention_thread = threading.Thread(target=_loop, name="eventguard-retention", daemon=True)
+        _retention_thread.start()
+        return _retention_thread
+
+
+def list_rollups(table: str, granularity: str = "hour", since: str = None):
+    """Return rollup rows for 'alerts', 'geo_alerts' or 'incidents', oldest first."""
+    rollup_table = {p.table: p.rollup_table for p in RETENTION_POLICIES}[table]
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""SELECT * FROM {rollup_table} WHERE granularity = ? AND bucket_start >= ?
+                ORDER BY bucket_start""",
+            (granularity, since or ""),
+        )
+        return cur.fetchall()
+
+
+# Full-text search
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def _search(fts: str, text: str, limit: int, filters: dict):
+    table, columns = FTS_INDEXES[fts]
+    match = _fts_query(text)
+    if not match:
+        return []
+    conditions = [f"t.{col} = ?" for col, value in filters.items() if value]
+    params = [value for value in filters.values() if value]
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,))
+        if cur.fetchone():
+            where = " AND ".join([f"{fts} MATCH ?"] + conditions)
+            cur.execute(
+                f"""SELECT t.* FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+                    WHERE {where} ORDER BY {fts}.rank LIMIT ?""",
+                [match] + params + [limit],
+            )
+        else:
+            # No FTS5 available: every word must appear in some column
+            words = re.findall(r"\w+", text)
+            haystack = " || ' ' || ".join(f"COALESCE(t.{c}, '')" for c in columns)
+            like_conditions = [f"({haystack}) LIKE ?" for _ in words]
+            cur.execute(
+                f"""SELECT t.* FROM {table} t WHERE {' AND '.join(like_conditions + conditions)}
+                    ORDER BY t.id DESC LIMIT ?""",
+                [f"%{w}%" for w in words] + params + [limit],
+            )
+        return cur.fetchall()
+
+
+def search_incidents(text: str, limit: int = 50, status: str = None):
+    """Ranked full-text search over incident type, location, description and notes."""
+    return _search("incidents_fts", text, limit, {"status": status})
+
+
+def search_lost_found_reports(text: str, limit: int = 50, status: str = None,
+                              report_type: str = None):
+    """Ranked full-text search over lost & found names, descriptions, locations and notes."""
+    return _search("lost_found_fts", text, limit, {"status": status, "report_type": report_type})
+
+
+# Dashboard aggregates
+INCIDENT_CLOSED_STATUSES = ("resolved", "closed")
+
+
+def get_dashboard_summary() -> dict:
+    """
+    Return dashboard totals from the trigger-maintained counters in a single
+    query: active/total incidents, incidents by status, predictive alerts,
+    unresolved geo alerts (total and by severity) and active zones. Totals
+    include rows retention has since rolled up, archived or deleted.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT metric, key, value FROM stat_counters
+               UNION ALL
+               SELECT 'zones_active', '', COUNT(*) FROM zones WHERE is_active = 1"""
+        )
+        rows = cur.fetchall()
+    incidents_by_status = {}
+    geo_by_severity = {}
+    summary = {"alerts": 0, "zones_active": 0}
+    for row in rows:
+        if row["metric"] == "incidents_by_status":
+            incidents_by_status[row["key"]] = row["value"]
+        elif row["metric"] == "geo_alerts_unresolved":
+            geo_by_severity[row["key"]] = row["value"]
+        else:
+            summary[row["metric"]] = row["value"]
+    summary["incidents_by_status"] = incidents_by_status
+    summary["incidents_total"] = sum(incidents_by_status.values())
+    summary["incidents_active"] = sum(
+        v for k, v in incidents_by_status.items() if k not in INCIDENT_CLOSED_STATUSES
+    )
+    summary["geo_alerts_by_severity"] = geo_by_severity
+    summary["geo_alerts_unresolved"] = sum(geo_by_severity.values())
+    return summary
+
+
+def count_geo_alerts_by(group_by: str = "severity", unresolved_only: bool = True) -> dict:
+    """Count geo alerts grouped by 'severity', 'alert_type' or 'zone' (zone name)."""
+    column = {"severity": "ga.severity", "alert_type": "ga.alert_type", "zone": "z.name"}[group_by]
+    where = "WHERE ga.is_resolved = 0" if unresolved_only else ""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""SELECT {column} AS k, COUNT(*) AS n
+                FROM geo_alerts ga JOIN zones z ON ga.zone_id = z.id
+                {where} GROUP BY {column}"""
+        )
+        return {row["k"]: row["n"] for row in cur.fetchall()}
+
+
+def count_incidents_by(group_by: str = "severity") -> dict:
+    """Count incidents grouped by 'severity', 'status' or 'type'."""
+    column = {"severity": "severity", "status": "status", "type": "type"}[group_by]
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {column} AS k, COUNT(*) AS n FROM incidents GROUP BY {column}")
+        return {row["k"]: row["n"] for row in cur.fetchall()}
+
+
+def count_by_time_bucket(table: str, granularity: str = "hour", since: str = None) -> list:
+    """
+    Count live rows of 'alerts', 'geo_alerts' or 'incidents' per minute or
+    hour bucket. Returns (bucket_start, count) rows, oldest first.
+    """
+    time_col = {p.table: p.time_column for p in RETENTION_POLICIES}[table]
+    prefix = dict(_ROLLUP_GRANULARITIES)[granularity]
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""SELECT substr({time_col}, 1, {prefix}) AS bucket_start, COUNT(*) AS count
+                FROM {table} WHERE {time_col} >= ?
+                GROUP BY 1 ORDER BY 1""",
+            (since or "",),
+        )
+        return cur.fetchall()
 
 
 # Initialize DB on import
 init_db()
+if WRITE_BEHIND:
+    enable_write_behind()
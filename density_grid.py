@@ -0,0 +1,146 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from geodesy import EARTH_RADIUS_M
+
+
+def _gaussian_kernel(sigma: float) -> np.ndarray:
+    half = max(1, int(np.ceil(3 * sigma)))
+    x = np.arange(-half, half + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def _smooth(grid: np.ndarray, sigma: float) -> np.ndarray:
+    """Separable Gaussian blur (sigma in cells), zero outside the grid."""
+    kernel = _gaussian_kernel(sigma)
+    pad = len(kernel) // 2
+    out = np.pad(grid, ((pad, pad), (0, 0)))
+    out = sum(w * out[i:i + grid.shape[0]] for i, w in enumerate(kernel))
+    out = np.pad(out, ((0, 0), (pad, pad)))
+    return sum(w * out[:, i:i + grid.shape[1]] for i, w in enumerate(kernel))
+
+
+class DensityGrid:
+    """
+    Metric raster of point counts and weights.
+
+    Points are binned once into square cells of ``cell_meters`` on a local
+    equirectangular projection; per-cell count, weight sum and weight max are
+    kept side by side (row = south to north, column = west to east). Zone
+    densities, hotspots and heatmap layers are then read by summing cells,
+    so every consumer shares one O(N) pass over the points instead of
+    re-scanning them. ``sigma_cells`` > 0 makes ``smoothed`` a Gaussian blur
+    of the weight layer (counts when unweighted) for heatmaps and hotspots.
+    """
+
+    def __init__(self, lats, lngs, weights=None, cell_meters: float = 10.0,
+                 sigma_cells: float = 0.0, origin: Tuple[float, float] = None):
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_meters = float(cell_meters)
+        if origin is None:
+            origin = (float(lats.min()), float(lngs.min())) if len(lats) else (0.0, 0.0)
+        self._m_per_deg_lat = np.radians(1.0) * EARTH_RADIUS_M
+        self._m_per_deg_lng = self._m_per_deg_lat * np.cos(np.radians(origin[0]))
+        self.origin = origin
+        # Leave room for the blur so smoothing is not clipped at the edges
+        self._margin = margin = int(np.ceil(3 * sigma_cells)) if sigma_cells > 0 else 0
+
+        rows, cols = self._cell_of(lats, lngs)
+        self.n_rows = (int(rows.max()) if len(rows) else margin) + 1 + margin
+        self.n_cols = (int(cols.max()) if len(cols) else margin) + 1 + margin
+        shape = (self.n_rows, self.n_cols)
+        flat = rows * self.n_cols + cols
+        size = self.n_rows * self.n_cols
+        self.counts = np.bincount(flat, minlength=size).reshape(shape).astype(np.float64)
+        if weights is None:
+            self.weight_sum = self.counts
+            self.weight_max = (self.counts > 0).astype(np.float64)
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            self.weight_sum = np.bincount(flat, weights=weights, minlength=size).reshape(shape)
+            weight_max = np.full(size, -np.inf)
+            np.maximum.at(weight_max, flat, weights)
+            self.weight_max = weight_max.reshape(shape)
+        self.smoothed = _smooth(self.weight_sum, sigma_cells) if sigma_cells > 0 else self.weight_sum
+
+    def _cell_of(self, lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.floor((lats - self.origin[0]) * self._m_per_deg_lat / self.cell_meters)
+        cols = np.floor((lngs - self.origin[1]) * self._m_per_deg_lng / self.cell_meters)
+        return rows.astype(np.int64) + self._margin, cols.astype(np.int64) + self._margin
+
+    def _row_lat(self, rows) -> np.ndarray:
+        return self.origin[0] + (rows - self._margin + 0.5) * self.cell_meters / self._m_per_deg_lat
+
+    def _col_lng(self, cols) -> np.ndarray:
+        return self.origin[1] + (cols - self._margin + 0.5) * self.cell_meters / self._m_per_deg_lng
+
+    def cell_centers(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Latitude and longitude of every cell center, each shaped like the grid."""
+        return np.meshgrid(self._row_lat(np.arange(self.n_rows)),
+                           self._col_lng(np.arange(self.n_cols)), indexing="ij")
+
+    def cell_bounds(self, rows, cols) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(south, west, north, east) edges of the given cells."""
+        half_lat = self.cell_meters / 2 / self._m_per_deg_lat
+        half_lng = self.cell_meters / 2 / self._m_per_deg_lng
+        lat, lng = self._row_lat(np.asarray(rows)), self._col_lng(np.asarray(cols))
+        return lat - half_lat, lng - half_lng, lat + half_lat, lng + half_lng
+
+    def circle_window(self, lat: float, lng: float, radius_m: float):
+        """
+        (row slice, col slice, mask) for the cells whose centers lie within
+        radius_m of (lat, lng). Only the bounding window is examined.
+        """
+        cy = (lat - self.origin[0]) * self._m_per_deg_lat + self._margin * self.cell_meters
+        cx = (lng - self.origin[1]) * self._m_per_deg_lng + self._margin * self.cell_meters
+        r0 = max(int(np.floor((cy - radius_m) / self.cell_meters)), 0)
+        r1 = max(min(int(np.floor((cy + radius_m) / self.cell_meters)) + 1, self.n_rows), r0)
+        c0 = max(int(np.floor((cx - radius_m) / self.cell_meters)), 0)
+        c1 = max(min(int(np.floor((cx + radius_m) / self.cell_meters)) + 1, self.n_cols), c0)
+        y = (np.arange(r0, r1) + 0.5) * self.cell_meters
+        x = (np.arange(c0, c1) + 0.5) * self.cell_meters
+        mask = ((y[:, None] - cy) ** 2 + (x[None, :] - cx) ** 2) <= radius_m ** 2
+        return slice(r0, r1), slice(c0, c1), mask
+
+    def box_window(self, south: float, west: float, north: float, east: float):
+        """(row slice, col slice) of the cells whose centers lie inside the box."""
+        ys = (south - self.origin[0]) * self._m_per_deg_lat / self.cell_meters + self._margin
+        yn = (north - self.origin[0]) * self._m_per_deg_lat / self.cell_meters + self._margin
+        xw = (west - self.origin[1]) * self._m_per_deg_lng / self.cell_meters + self._margin
+        xe = (east - self.origin[1]) * self._m_per_deg_lng / self.cell_meters + self._margin
+        r0 = min(max(int(np.ceil(ys - 0.5)), 0), self.n_rows)
+        r1 = max(min(int(np.floor(yn - 0.5)) + 1, self.n_rows), r0)
+        c0 = min(max(int(np.ceil(xw - 0.5)), 0), self.n_cols)
+        c1 = max(min(int(np.floor(xe - 0.5)) + 1, self.n_cols), c0)
+        return slice(r0, r1), slice(c0, c1)
+
+    def sum_circle(self, lat: float, lng: float, radius_m: float, layer: str = "counts") -> float:
+        rows, cols, mask = self.circle_window(lat, lng, radius_m)
+        return float(getattr(self, layer)[rows, cols][mask].sum())
+
+    def hotspots(self, threshold: float, layer: str = "smoothed") -> List[Tuple[float, float, float]]:
+        """(lat, lng, value) at the center of every cell above threshold."""
+        values = getattr(self, layer)
+        rows, cols = np.nonzero(values > threshold)
+        return self._cell_points(rows, cols, values)
+
+    def heat_points(self, layer: str = "smoothed",
+                    min_fraction: float = 0.01) -> List[Tuple[float, float, float]]:
+        """
+        Heatmap layer: one (lat, lng, weight) per cell above min_fraction of
+        the layer maximum, with weights normalized to that maximum. Point
+        count is bounded by the grid size, not by the number of input points.
+        """
+        values = getattr(self, layer)
+        peak = float(values.max()) if values.size else 0.0
+        if peak <= 0:
+            return []
+        rows, cols = np.nonzero(values > peak * min_fraction)
+        return self._cell_points(rows, cols, values / peak)
+
+    def _cell_points(self, rows, cols, values) -> List[Tuple[float, float, float]]:
+        return list(zip(self._row_lat(rows).tolist(), self._col_lng(cols).tolist(),
+                        values[rows, cols].tolist()))
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Model variant and inference size, overridable per deployment
+YOLO_MODEL = os.environ.get("EVENTGUARD_YOLO_MODEL", "yolov8n.pt")
+YOLO_IMGSZ = int(os.environ.get("EVENTGUARD_YOLO_IMGSZ", "640"))
+try:
+    import streamlit as st
+    vision = st.secrets.get("vision", {})
+    YOLO_MODEL = vision.get("YOLO_MODEL", YOLO_MODEL)
+    YOLO_IMGSZ = int(vision.get("YOLO_IMGSZ", YOLO_IMGSZ))
+except Exception:
+    pass
+
+PERSON_CLASS = 0
+
+Rect = Tuple[int, int, int, int]
+
+
+class PersonDetector:
+    """
+    A loaded YOLO model plus the settings used for crowd counting.
+
+    The model is deserialized and warmed up (one inference on a blank frame,
+    which triggers layer fusing and allocator setup) when the detector is
+    created, so the first real frame runs at steady-state speed. Inference
+    is serialized with a lock because ultralytics predictors keep per-call
+    state and are not safe to share between threads.
+    """
+
+    def __init__(self, model: str = YOLO_MODEL, imgsz: int = YOLO_IMGSZ,
+                 conf: float = 0.35, iou: float = 0.45):
+        from ultralytics import YOLO
+
+        self.model_name = model
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self._lock = threading.Lock()
+        started = time.perf_counter()
+        self.model = YOLO(model)
+        self.warm_up()
+        self.load_seconds = time.perf_counter() - started
+
+    def warm_up(self):
+        self.predict(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+
+    def predict(self, frame):
+        with self._lock:
+            return self.model.predict(frame, conf=self.conf, iou=self.iou,
+                                      imgsz=self.imgsz, verbose=False)
+
+    def detect_people(self, frame) -> List[Rect]:
+        """Person boxes in one BGR frame as (x, y, w, h)."""
+        return self.detect_people_batch([frame])[0].tolist()
+
+    def detect_people_batch(self, frames) -> List[np.ndarray]:
+        """
+        Person boxes for several frames from a single predict call, one
+        int (n, 4) array of (x, y, w, h) per frame. Batching amortizes the
+        per-call pre/post-processing and lets the backend vectorize across
+        frames.
+        """
+        return [person_boxes(res) for res in self.predict(list(frames))]
+
+
+def person_boxes(res) -> np.ndarray:
+    """(x, y, w, h) int array of the person detections in one result."""
+    if not res or res.boxes is None:
+        return np.empty((0, 4), dtype=int)
+    b = res.boxes
+    xyxy = b.xyxy.cpu().numpy()[b.cls.cpu().numpy().astype(int) == PERSON_CLASS]
+    xyxy[:, 2:] -= xyxy[:, :2]
+    return xyxy.astype(int)
+
+
+# One future per (model, imgsz): the lock only guards the dict, so loading one
+# model never blocks callers that want another, and preloads never block
+_detectors: Dict[Tuple[str, int], Future] = {}
+_detectors_lock = threading.Lock()
+
+
+def _claim(key: Tuple[str, int]) -> Tuple[Future, bool]:
+    """The future for key, and whether the caller must load it."""
+    with _detectors_lock:
+        future = _detectors.get(key)
+        if future is not None:
+            return future, False
+        future = _detectors[key] = Future()
+        return future, True
+
+
+def _load(key: Tuple[str, int], future: Future):
+    try:
+        future.set_result(PersonDetector(*key))
+    except BaseException as e:
+        # Forget the failed attempt so the next caller retries
+        with _detectors_lock:
+            _detectors.pop(key, None)
+        future.set_exception(e)
+
+
+def get_detector(model: str = None, imgsz: int = None) -> PersonDetector:
+    """
+    Process-wide detector for (model, imgsz), loaded and warmed up on first
+    use. Every session and thread shares the same instance, so memory does
+    not grow with the number of operators. Callers asking for a detector
+    that is still loading wait for that load instead of starting another.
+    """
+    key = (model or YOLO_MODEL, int(imgsz or YOLO_IMGSZ))
+    future, owner = _claim(key)
+    if owner:
+        _load(key, future)
+    return future.result()
+
+
+def preload_detector(model: str = None, imgsz: int = None):
+    """Start loading the detector on a background thread if it is not loaded yet; never blocks."""
+    key = (model or YOLO_MODEL, int(imgsz or YOLO_IMGSZ))
+    future, owner = _claim(key)
+    if owner:
+        threading.Thread(target=_load, args=(key, future), daemon=True,
+                         name="detector-preload").start()
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class EntityStore:
+    """
+    Columnar store for tracked entities.
+
+    Positions live in contiguous float64 arrays, ids are int64, last-seen
+    times are int64 epoch nanoseconds and names/types are int32 codes into
+    interned string tables. Stores without explicit names derive them from
+    the id with ``name_format``, so no per-entity strings are kept at all.
+    That is ~40 bytes per entity instead of a dict with string values, and
+    moves/updates are single vectorized operations.
+
+    For code that expects the old list-of-dicts shape, iterating the store or
+    indexing it yields one dict per entity with id, name, entity_type, lat,
+    lng and an ISO timestamp.
+    """
+
+    def __init__(self, ids, lats, lngs, names: Optional[List[str]] = None,
+                 entity_type: str = "person", timestamps_ns=None, id_prefix: str = "entity_",
+                 name_format: str = "Person {n}"):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.lat = np.ascontiguousarray(lats, dtype=np.float64)
+        self.lng = np.ascontiguousarray(lngs, dtype=np.float64)
+        n = len(self.ids)
+        if timestamps_ns is None:
+            self.ts_ns = np.full(n, time.time_ns(), dtype=np.int64)
+        else:
+            self.ts_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        self.id_prefix = id_prefix
+        self.name_format = name_format
+        if names is not None:
+            self.name_table, self.name_codes = self._intern(names)
+        else:
+            self.name_table, self.name_codes = None, None
+        self.type_table = [entity_type]
+        self.type_codes = np.zeros(n, dtype=np.int32)
+
+    @staticmethod
+    def _intern(values):
+        table = {}
+        codes = np.fromiter((table.setdefault(v, len(table)) for v in values), dtype=np.int32,
+                            count=len(values))
+        return list(table), codes
+
+    @classmethod
+    def simulate(cls, base_lat: float, base_lng: float, num_entities: int = 50,
+                 spread: float = 0.01, rng: np.random.Generator = None) -> "EntityStore":
+        """Random entities within +/- spread degrees (~1km) of the base location."""
+        rng = rng or np.random.default_rng()
+        ids = np.arange(num_entities, dtype=np.int64)
+        return cls(
+            ids,
+            base_lat + rng.uniform(-spread, spread, num_entities),
+            base_lng + rng.uniform(-spread, spread, num_entities),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def entity_id(self, i: int) -> str:
+        return f"{self.id_prefix}{int(self.ids[i]):03d}"
+
+    def entity_ids(self) -> np.ndarray:
+        """All ids formatted like entity_id(), as a string array."""
+        return np.char.add(self.id_prefix, np.char.zfill(self.ids.astype(str), 3))
+
+    def name(self, i: int) -> str:
+        if self.name_table is None:
+            return self.name_format.format(n=int(self.ids[i]) + 1)
+        return self.name_table[self.name_codes[i]]
+
+    def names(self) -> pd.Categorical:
+        """All names as a Categorical (codes over the interned table)."""
+        if self.name_table is None:
+            return pd.Categorical([self.name(i) for i in range(len(self))])
+        return pd.Categorical.from_codes(self.name_codes, categories=self.name_table)
+
+    def __getitem__(self, i: int) -> Dict:
+        return {
+            "id": self.entity_id(i),
+            "name": self.name(i),
+            "entity_type": self.type_table[self.type_codes[i]],
+            "lat": float(self.lat[i]),
+            "lng": float(self.lng[i]),
+            "timestamp": datetime.utcfromtimestamp(self.ts_ns[i] / 1e9).isoformat(),
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def move(self, dlat, dlng, indices=None):
+        """Shift positions (all, or the given indices) by dlat/dlng degrees and stamp them."""
+        sel = slice(None) if indices is None else indices
+        self.lat[sel] += dlat
+        self.lng[sel] += dlng
+        self.ts_ns[sel] = time.time_ns()
+
+    def jitter(self, max_step: float = 0.0001, rng: np.random.Generator = None):
+        """Random walk step of up to +/- max_step degrees for every entity."""
+        rng = rng or np.random.default_rng()
+        n = len(self)
+        self.move(rng.uniform(-max_step, max_step, n), rng.uniform(-max_step, max_step, n))
+
+    def update_positions(self, indices, lats, lngs, timestamps_ns=None):
+        """Overwrite positions of the given entities."""
+        self.lat[indices] = lats
+        self.lng[indices] = lngs
+        self.ts_ns[indices] = time.time_ns() if timestamps_ns is None else timestamps_ns
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        DataFrame view. The numeric columns wrap the store's arrays without
+        copying (pandas may still copy when consolidating blocks), ids are
+        the same strings entity_id() returns and names are a Categorical
+        over the interned table.
+        """
+        return pd.DataFrame({
+            "id": self.entity_ids(),
+            "name": self.names(),
+            "lat": self.lat,
+            "lng": self.lng,
+            "timestamp": pd.to_datetime(self.ts_ns, unit="ns"),
+        }, copy=False)
+
+    def to_arrow(self):
+        """Arrow table over the same buffers; requires pyarrow."""
+        import pyarrow as pa
+
+        names = self.names()
+        return pa.table({
+            "id": pa.array(self.entity_ids()),
+            "name": pa.DictionaryArray.from_arrays(pa.array(names.codes), pa.array(list(names.categories))),
+            "lat": pa.array(self.lat),
+            "lng": pa.array(self.lng),
+            "timestamp": pa.array(self.ts_ns.view("datetime64[ns]")),
+        })
+
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays (excluding the interned tables)."""
+        arrays = [self.ids, self.lat, self.lng, self.ts_ns, self.type_codes]
+        if self.name_codes is not None:
+            arrays.append(self.name_codes)
+        return sum(a.nbytes for a in arrays)
@@ -4,10 +4,11 @@ import pandas as pd
 import streamlit as st
 from streamlit_folium import st_folium
 import os
+import time
 
 from ai import gemini_summarize, analyze_heatmap_data
 from db import (list_incidents, list_events_by_user, add_blueprint, get_blueprint_by_event,
-               list_blueprints_by_user, update_blueprint_bounds)
+               list_blueprints_by_user, update_blueprint_bounds, downsample_density_samples)
 from maps import create_heatmap, create_heatmap_with_blueprint, geocode_location
 from blueprint_utils import (save_uploaded_blueprint, create_blueprint_overlay_map,
                            generate_blueprint_heatmap_points, validate_blueprint_bounds,
@@ -58,7 +59,12 @@ def ai_summaries_tab():
     
     zone = st.text_input("Summarize security concerns in [Zone Name]", value="East Concourse")
 
-    density = st.session_state.sim["density_series"].tolist()
+    # Prefer persisted per-minute history for the zone over the session series
+    buckets = downsample_density_samples(zone, bucket_seconds=60, start_ts=time.time() - 2 * 3600)
+    if buckets:
+        density = [b["density_mean"] for b in buckets]
+    else:
+        density = st.session_state.sim["density_series"].tolist()
     incidents = [r["type"] for r in list_incidents(10)]
     tweets = [
         "Crowd moving slow near gate",
@@ -1,7 +1,7 @@
 import streamlit as st
 
 from auth import is_test_mode
-from db import list_alerts, list_incidents, list_geo_alerts, list_zones
+from db import get_dashboard_summary, list_geo_alerts, list_zones, zone_density_summary
 
 
 def dashboard_page():
@@ -10,23 +10,23 @@ def dashboard_page():
     st.write(f"Current Event: {ev}")
     
     # Main metrics
+    summary = get_dashboard_summary()
     cols = st.columns(4)
     
     with cols[0]:
-        incidents = list_incidents()
-        st.metric("Active Incidents", len(incidents))
+        st.metric("Active Incidents", summary["incidents_active"])
     
     with cols[1]:
-        alerts = list_alerts()
-        st.metric("Predictive Alerts", len(alerts))
+        st.metric("Predictive Alerts", summary["alerts"])
     
     with cols[2]:
-        geo_alerts = list_geo_alerts(unresolved_only=True)
-        st.metric("Geo-Fencing Alerts", len(geo_alerts))
+        st.metric("Geo-Fencing Alerts", summary["geo_alerts_unresolved"])
     
     with cols[3]:
-        zones = list_zones(active_only=True)
-        st.metric("Active Zones", len(zones))
+        st.metric("Active Zones", summary["zones_active"])
+    
+    geo_alerts = list_geo_alerts(unresolved_only=True) if summary["geo_alerts_unresolved"] else []
+    zones = list_zones(active_only=True) if summary["zones_active"] else []
     
     # Recent geo-fencing alerts
     if geo_alerts:
@@ -49,7 +49,9 @@ def dashboard_page():
         # Show other alerts
         other_alerts = [a for a in geo_alerts if a['severity'] in ['medium', 'low']]
         if other_alerts:
-            with st.expander(f"View {len(other_alerts)} other alerts"):
+            by_severity = summary["geo_alerts_by_severity"]
+            other_count = by_severity.get('medium', 0) + by_severity.get('low', 0)
+            with st.expander(f"View {other_count} other alerts"):
                 for alert in other_alerts[:5]:
                     st.info(f"• {alert['message']} - {alert['zone_name']}")
     
@@ -70,6 +72,21 @@ def dashboard_page():
                     help=f"Radius: {zone['radius_meters']}m, Threshold: {zone['density_threshold']}"
                 )
     
+    # Live camera readings (written by camera_manager.py)
+    camera_zones = zone_density_summary(window_seconds=60)
+    if camera_zones:
+        st.subheader("📹 Camera Zones (last minute)")
+        camera_cols = st.columns(min(len(camera_zones), 4))
+        for i, reading in enumerate(camera_zones):
+            velocity = reading['velocity_mean']
+            with camera_cols[i % len(camera_cols)]:
+                st.metric(
+                    reading['zone'],
+                    f"{reading['density_mean']:.2f} /m²",
+                    help=f"Cameras: {reading['sources']}, peak {reading['density_max']:.2f} /m²"
+                         + (f", velocity {velocity:.2f} m/s" if velocity is not None else "")
+                )
+    
     # System status
     st.subheader("System Status")
     status_cols = st.columns(3)
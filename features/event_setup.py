@@ -4,6 +4,7 @@ import os
 
 from db import create_event, list_events_by_user, add_blueprint
 from blueprint_utils import save_uploaded_blueprint, validate_blueprint_bounds
+from maps import forget_event_blueprint
 
 
 def event_setup_page():
@@ -112,6 +113,7 @@ def event_setup_page():
                         venue_bounds_west=west_bound,
                         description=f"Blueprint for {event_name}"
                     )
+                    forget_event_blueprint()
             
             st.success("Event registered successfully!")
             if uploaded_blueprint and blueprint_name.strip():
@@ -5,12 +5,18 @@ import random
 from datetime import datetime, timedelta
 from streamlit_folium import st_folium
 
-from db import (create_zone, list_zones, add_geo_alert, list_geo_alerts, 
+from entity_store import EntityStore
+from fence_engine import FenceEngine
+
+from db import (create_zone, create_polygon_zone, list_zones, add_geo_alert, list_geo_alerts, 
                resolve_geo_alert, add_tracking_entity, update_tracking_entity_location,
-               list_tracking_entities, get_entity_location)
+               list_tracking_entities, get_entity_location, transaction,
+               add_geo_alerts_bulk, upsert_tracking_entities_bulk,
+               update_tracking_locations_bulk, add_trajectory_points, list_trajectories)
 from geo_utils import (haversine_distance, is_point_in_circle, create_geo_fence_map,
-                      simulate_crowd_movement, generate_zone_alerts, format_alert_message,
-                      get_zone_statistics, get_zone_color, get_zone_icon)
+                      simulate_crowd_movement, format_alert_message,
+                      get_zone_statistics, get_zone_color, get_zone_icon,
+                      entity_density_grid, grid_zone_densities, create_trajectory_map)
 
 
 def geo_fencing_page():
@@ -22,6 +28,7 @@ def geo_fencing_page():
             "simulation_running": False,
             "last_update": None,
             "simulated_entities": [],
+            "fence_engine": FenceEngine(),
             "base_lat": 28.6139,
             "base_lng": 77.2090
         }
@@ -55,9 +62,31 @@ def zone_management_tab():
                 density_threshold = st.number_input("Density Threshold", min_value=1, max_value=1000, value=100)
             
             description = st.text_area("Description (Optional)", placeholder="Describe the purpose of this zone...")
+            polygon_text = st.text_area(
+                "Polygon Vertices (Optional)",
+                placeholder="One 'lat, lng' per line (at least 3). Overrides center and radius.",
+            )
             
             if st.form_submit_button("Create Zone", type="primary"):
-                if zone_name.strip():
+                if not zone_name.strip():
+                    st.error("Please provide a zone name")
+                elif polygon_text.strip():
+                    try:
+                        vertices = [tuple(float(v) for v in line.split(","))
+                                    for line in polygon_text.strip().splitlines() if line.strip()]
+                        create_polygon_zone(
+                            name=zone_name,
+                            zone_type=zone_type,
+                            vertices=vertices,
+                            description=description if description.strip() else None,
+                            density_threshold=density_threshold
+                        )
+                    except ValueError as e:
+                        st.error(f"Invalid polygon: {e}")
+                    else:
+                        st.success(f"✅ Zone '{zone_name}' created successfully!")
+                        st.rerun()
+                else:
                     create_zone(
                         name=zone_name,
                         zone_type=zone_type,
@@ -69,8 +98,6 @@ def zone_management_tab():
                     )
                     st.success(f"✅ Zone '{zone_name}' created successfully!")
                     st.rerun()
-                else:
-                    st.error("Please provide a zone name")
     
     # Display existing zones
     st.subheader("Active Zones")
@@ -100,7 +127,10 @@ def zone_management_tab():
                 
                 with col1:
                     st.write(f"**Type:** {zone['zone_type']}")
-                    st.write(f"**Radius:** {zone['radius_meters']}m")
+                    if zone['shape'] == 'polygon':
+                        st.write(f"**Shape:** polygon ({len(zone['vertices']) // 16} vertices)")
+                    else:
+                        st.write(f"**Radius:** {zone['radius_meters']}m")
                     st.write(f"**Density Threshold:** {zone['density_threshold']}")
                 
                 with col2:
@@ -144,11 +174,18 @@ def tracking_tab():
     with col1:
         if st.button("🎬 Start Simulation", disabled=st.session_state.geo_fencing_state["simulation_running"]):
             st.session_state.geo_fencing_state["simulation_running"] = True
-            st.session_state.geo_fencing_state["simulated_entities"] = simulate_crowd_movement(
+            entities = st.session_state.geo_fencing_state["simulated_entities"] = EntityStore.simulate(
                 st.session_state.geo_fencing_state["base_lat"],
                 st.session_state.geo_fencing_state["base_lng"],
                 num_entities=50
             )
+            # Register the crowd and its starting positions, so replay tracks begin here
+            now = time.time()
+            with transaction():
+                upsert_tracking_entities_bulk(entities)
+                add_trajectory_points((entities.entity_id(i), now, entities.lat[i], entities.lng[i])
+                                      for i in range(len(entities)))
+            st.session_state.geo_fencing_state.setdefault("fence_engine", FenceEngine()).reset()
             st.success("Simulation started!")
             st.rerun()
     
@@ -161,27 +198,22 @@ def tracking_tab():
     with col3:
         if st.button("🔄 Update Positions"):
             if st.session_state.geo_fencing_state["simulation_running"]:
-                # Simulate movement
-                for entity in st.session_state.geo_fencing_state["simulated_entities"]:
-                    # Add small random movement
-                    entity["lat"] += random.uniform(-0.0001, 0.0001)
-                    entity["lng"] += random.uniform(-0.0001, 0.0001)
-                    entity["timestamp"] = datetime.utcnow().isoformat()
+                # Simulate movement (small random step for every entity)
+                st.session_state.geo_fencing_state["simulated_entities"].jitter(0.0001)
                 
-                # Check for zone violations and generate alerts
+                # Only zone entries/exits/dwell and density crossings raise alerts
+                entities = st.session_state.geo_fencing_state["simulated_entities"]
+                engine = st.session_state.geo_fencing_state.setdefault("fence_engine", FenceEngine())
                 zones = list_zones(active_only=True)
-                new_alerts = generate_zone_alerts(st.session_state.geo_fencing_state["simulated_entities"], zones)
+                new_alerts = engine.update(entities, zones)
                 
-                for alert in new_alerts:
-                    add_geo_alert(
-                        zone_id=alert['zone_id'],
-                        alert_type=alert['alert_type'],
-                        entity_id=alert.get('entity_id'),
-                        entity_lat=alert.get('entity_lat'),
-                        entity_lng=alert.get('entity_lng'),
-                        message=alert['message'],
-                        severity=alert['severity']
-                    )
+                # Persist the whole tick (moved positions + alerts) in a single commit
+                now = time.time()
+                with transaction():
+                    update_tracking_locations_bulk([entities[i] for i in engine.changed])
+                    add_trajectory_points((entities.entity_id(i), now, entities.lat[i], entities.lng[i])
+                                          for i in engine.changed)
+                    add_geo_alerts_bulk(new_alerts)
                 
                 st.session_state.geo_fencing_state["last_update"] = datetime.utcnow()
                 st.success("Positions updated!")
@@ -207,12 +239,11 @@ def tracking_tab():
             st.metric("Last Update", "Never")
     
     # Entity tracking table
-    if st.session_state.geo_fencing_state["simulated_entities"]:
+    if len(st.session_state.geo_fencing_state["simulated_entities"]):
         st.subheader("Entity Positions")
         
         # Create DataFrame for display
-        df = pd.DataFrame(st.session_state.geo_fencing_state["simulated_entities"])
-        df = df[['id', 'name', 'lat', 'lng', 'timestamp']]
+        df = st.session_state.geo_fencing_state["simulated_entities"].to_dataframe()
         df.columns = ['ID', 'Name', 'Latitude', 'Longitude', 'Last Update']
         
         st.dataframe(df, use_container_width=True)
@@ -222,14 +253,10 @@ def tracking_tab():
         if zones:
             st.subheader("Zone Analysis")
             
-            for zone in zones:
-                density = calculate_zone_density(
-                    st.session_state.geo_fencing_state["simulated_entities"],
-                    zone['center_lat'],
-                    zone['center_lng'],
-                    zone['radius_meters']
-                )
-                
+            # One binning pass over the crowd; zone counts are read from its cells
+            grid = entity_density_grid(st.session_state.geo_fencing_state["simulated_entities"])
+            densities = grid_zone_densities(grid, zones)
+            for zone, density in zip(zones, densities):
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.write(f"**{zone['name']}**")
@@ -241,6 +268,8 @@ def tracking_tab():
                         st.error(f"⚠️ Exceeds threshold ({threshold})")
                     else:
                         st.success(f"✅ Within threshold ({threshold})")
+        
+        movement_replay()
     else:
         st.info("No entities being tracked. Start the simulation to begin tracking.")
 
@@ -258,9 +287,7 @@ def tracking_tab():
         st.subheader("Zone Density Analysis")
         
         density_data = []
-        for zone in zones:
-            density = calculate_zone_density(entities, zone['center_lat'], 
-                                           zone['center_lng'], zone['radius_meters'])
+        for zone, density in zip(zones, grid_zone_densities(entity_density_grid(entities), zones)):
             density_data.append({
                 'Zone': zone['name'],
                 'Type': zone['zone_type'],
@@ -273,6 +300,26 @@ def tracking_tab():
         st.dataframe(density_df, use_container_width=True)
 
 
+def movement_replay():
+    with st.expander("🕒 Movement Replay"):
+        minutes = st.slider("Time window (minutes ago)", 0, 60, (0, 15), key="replay_window")
+        tolerance = st.slider("Track simplification (meters)", 0, 50, 5, key="replay_tolerance")
+        now = time.time()
+        tracks = list_trajectories(start_ts=now - minutes[1] * 60, end_ts=now - minutes[0] * 60)
+        if not tracks:
+            st.info("No movement recorded in this window yet.")
+            return
+        total = sum(len(track) for track in tracks.values())
+        st.caption(f"{len(tracks)} tracks, {total} recorded positions")
+        map_obj = create_trajectory_map(
+            tracks,
+            center_lat=st.session_state.geo_fencing_state["base_lat"],
+            center_lng=st.session_state.geo_fencing_state["base_lng"],
+            tolerance_meters=tolerance,
+        )
+        st_folium(map_obj, width=800, height=450, key="replay_map")
+
+
 def calculate_zone_density(entities, center_lat, center_lng, radius):
     """Helper function to calculate zone density"""
     from geo_utils import calculate_zone_density
@@ -1,6 +1,7 @@
 import pandas as pd
 import streamlit as st
-from db import add_incident, list_incidents
+from core.ui import paginate
+from db import add_incident, list_incidents, search_incidents
 
 
 def incidents_page():
@@ -43,7 +44,12 @@ def incidents_page():
             st.success(f"✅ {severity.upper()} priority {type_} incident recorded at {location}")
 
     st.subheader("Recent Incidents")
-    rows = list_incidents(20)
+    query = st.text_input("Search incidents", placeholder="e.g., fainted north gate")
+    if query.strip():
+        rows = search_incidents(query, limit=50)
+        st.caption(f"{len(rows)} best matches for '{query}'")
+    else:
+        rows = paginate("incidents_page", list_incidents, lambda row: {"before_id": row["id"]})
     if rows:
         df = pd.DataFrame([dict(r) for r in rows])
         
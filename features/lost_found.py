@@ -7,7 +7,9 @@ import cv2
 import numpy as np
 from datetime import datetime
 
-from db import add_lost_found_report, list_lost_found_reports, update_lost_found_report
+from core.ui import paginate
+from db import (add_lost_found_report, list_lost_found_reports, update_lost_found_report,
+               search_lost_found_reports)
 from ai import gemini_vision_analyze, detect_lost_person_in_image
 
 
@@ -94,8 +96,7 @@ def lost_found_page():
         st.write("Upload surveillance footage or photos to check for lost persons")
         
         # Get active lost person reports
-        lost_reports = list_lost_found_reports(status="active")
-        lost_reports = [r for r in lost_reports if r["report_type"] == "lost"]
+        lost_reports = list_lost_found_reports(status="active", report_type="lost")
         
         if not lost_reports:
             st.info("No active lost person reports to review.")
@@ -168,17 +169,24 @@ def lost_found_page():
         with col2:
             filter_status = st.selectbox("Filter by Status", ["all", "active", "resolved", "closed"])
         
-        # Get reports based on filters
-        if filter_status == "all":
-            reports = list_lost_found_reports(limit=50)
-        else:
-            reports = list_lost_found_reports(limit=50, status=filter_status)
+        query = st.text_input("Search descriptions", placeholder="e.g., red jacket child")
         
-        if filter_type != "all":
-            reports = [r for r in reports if r["report_type"] == filter_type]
+        # Get matching reports, or one page of reports based on filters
+        filters = {
+            "status": None if filter_status == "all" else filter_status,
+            "report_type": None if filter_type == "all" else filter_type,
+        }
+        if query.strip():
+            reports = search_lost_found_reports(query, limit=50, **filters)
+        else:
+            reports = paginate(
+                f"lost_found_{filter_type}_{filter_status}",
+                lambda **kw: list_lost_found_reports(**filters, **kw),
+                lambda row: {"before_id": row["id"]},
+            )
         
         if reports:
-            st.write(f"**Found {len(reports)} reports**")
+            st.write(f"**Showing {len(reports)} reports**")
             
             for report in reports:
                 with st.expander(f"🔍 {report['report_type'].upper()} - {report['person_name'] or 'Unknown Person'} ({report['status']})"):
@@ -1,4 +1,7 @@
 import os
+import queue
+import sqlite3
+import threading
 import time
 import tempfile
 import numpy as np
@@ -7,9 +10,15 @@ import streamlit as st
 from datetime import datetime
 import cv2
 
-from db import add_alert
+from camera_pipeline import CameraPipeline
+from db import (add_alert, add_camera, add_density_samples, downsample_density_samples, list_cameras,
+                set_camera_active, zone_density_summary)
+from detector import get_detector, preload_detector
+from flow_engine import FLOW_METHODS, FlowEstimator, box_centroids, parse_roi
 from prediction import bottleneck_probability, forecast_next, simulate_crowd_series
-from ultralytics import YOLO
+
+# Sampled frames per detector call when analysing uploaded videos
+VIDEO_BATCH_SIZE = 8
 
 def _nms(rects, weights, iou_thresh=0.4):
     if len(rects) == 0:
@@ -38,7 +47,81 @@ def _nms(rects, weights, iou_thresh=0.4):
     return [tuple(map(int, rects[i])) for i in pick]
 
 
-def _estimate_from_video(file_bytes: bytes, area_m2: float, meters_per_pixel: float, frame_stride: int, max_frames: int):
+def _sampled_frames(cap, frame_stride: int, max_frames: int):
+    """Every frame_stride-th frame; skipped frames are grabbed but not decoded."""
+    idx = 0
+    total = 0
+    while total < max_frames:
+        if (idx % frame_stride) != 0:
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            total += 1
+        idx += 1
+
+
+def _prefetch(frames, depth: int):
+    """Iterate frames on a reader thread, keeping up to depth of them decoded ahead."""
+    buf = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def reader():
+        try:
+            for frame in frames:
+                while not stop.is_set():
+                    try:
+                        buf.put(frame, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        finally:
+            buf.put(done)
+
+    thread = threading.Thread(target=reader, daemon=True, name="video-reader")
+    thread.start()
+    try:
+        while True:
+            frame = buf.get()
+            if frame is done:
+                return
+            yield frame
+    finally:
+        stop.set()
+        # Unblock the final put if the consumer stopped early
+        while thread.is_alive():
+            try:
+                buf.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+
+def _batches(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _estimate_from_video(file_bytes: bytes, area_m2: float, meters_per_pixel: float, frame_stride: int,
+                         max_frames: int, batch_size: int = VIDEO_BATCH_SIZE, flow_options: dict = None):
+    """
+    Density series, median velocity and a stats dict (frames, seconds, fps)
+    for an uploaded clip. Frames are decoded ahead on a reader thread and
+    detected batch_size at a time with one predict call per batch; velocity
+    comes from a FlowEstimator built with flow_options.
+    """
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
     try:
         tmp.write(file_bytes)
@@ -46,48 +129,34 @@ def _estimate_from_video(file_bytes: bytes, area_m2: float, meters_per_pixel: fl
         tmp.close()
         cap = cv2.VideoCapture(tmp.name)
         fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-        yolo_model = YOLO("yolov8n.pt")
-        prev_gray = None
+        detector = get_detector()
+        flow = FlowEstimator(meters_per_pixel, **(flow_options or {}))
+        # Consecutive sampled frames are frame_stride source frames apart
+        dt = frame_stride / fps
+        prev_img = None
+        prev_points = None
         densities = []
         flows = []
-        total = 0
-        idx = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            if (idx % frame_stride) != 0:
-                idx += 1
-                continue
-            img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            rects = []
-            res = yolo_model.predict(frame, conf=0.35, iou=0.45, imgsz=640, verbose=False)[0]
-            if res and res.boxes is not None:
-                b = res.boxes
-                cls = b.cls.cpu().numpy().astype(int)
-                xyxy = b.xyxy.cpu().numpy()
-                for j in range(len(cls)):
-                    if cls[j] == 0:  # person class
-                        x1, y1, x2, y2 = xyxy[j]
-                        rects.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
-            count = len(rects)
-            density = count / max(area_m2, 1e-6)
-            densities.append(density)
-            if prev_gray is not None:
-                flow = cv2.calcOpticalFlowFarneback(prev_gray, img, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-                mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-                mean_pix_per_frame = float(np.nanmean(mag))
-                mps = mean_pix_per_frame * meters_per_pixel * fps
-                flows.append(mps)
-            prev_gray = img
-            total += 1
-            idx += 1
-            if total >= max_frames:
-                break
+        started = time.perf_counter()
+        frames = _prefetch(_sampled_frames(cap, frame_stride, max_frames), 2 * batch_size)
+        for batch in _batches(frames, batch_size):
+            boxes = detector.detect_people_batch(batch)
+            densities.extend(len(rects) / max(area_m2, 1e-6) for rects in boxes)
+            for frame, rects in zip(batch, boxes):
+                img = flow.prepare(frame)
+                if prev_img is not None:
+                    mps = flow.estimate(prev_img, img, dt, points=prev_points)
+                    if mps is not None:
+                        flows.append(mps)
+                prev_img = img
+                prev_points = box_centroids(rects)
+        elapsed = time.perf_counter() - started
         cap.release()
         density_series = np.array(densities, dtype=float)
         velocity_mps = float(np.nanmedian(flows)) if flows else 0.8
-        return density_series, velocity_mps
+        stats = {"frames": len(densities), "seconds": elapsed,
+                 "fps": len(densities) / elapsed if elapsed > 0 else 0.0}
+        return density_series, velocity_mps, stats
     finally:
         try:
             os.unlink(tmp.name)
@@ -95,9 +164,77 @@ def _estimate_from_video(file_bytes: bytes, area_m2: float, meters_per_pixel: fl
             pass
 
 
+def _flow_options(key: str):
+    """Velocity estimation settings as FlowEstimator kwargs, or None if the ROI is invalid."""
+    cols = st.columns(3)
+    with cols[0]:
+        method = st.selectbox("Velocity Method", FLOW_METHODS, key=f"{key}_flow_method",
+                              format_func=lambda m: {"farneback": "Dense (Farnebäck)",
+                                                     "lucas_kanade": "Sparse (Lucas–Kanade on people)"}[m])
+    with cols[1]:
+        max_width = st.number_input("Flow Width (px)", min_value=80, max_value=3840, value=480, step=80,
+                                    key=f"{key}_flow_width",
+                                    help="Frames are downscaled to at most this width before optical flow")
+    with cols[2]:
+        roi_text = st.text_input("Flow ROI (optional)", key=f"{key}_flow_roi",
+                                 placeholder="x,y; x,y; x,y (full-resolution pixels)")
+    try:
+        roi = parse_roi(roi_text)
+    except ValueError as e:
+        st.error(f"Invalid ROI: {e}")
+        return None
+    return {"method": method, "max_width": int(max_width), "roi": roi}
+
+
+def _cameras_panel(sim):
+    st.caption("Active cameras are processed continuously by `python camera_manager.py`, "
+               "which stores one density/velocity sample per camera per second under its zone.")
+    with st.form("camera_form"):
+        cols = st.columns(3)
+        with cols[0]:
+            cam_name = st.text_input("Camera Name", placeholder="e.g., Gate A overhead")
+            cam_source = st.text_input("Source", placeholder="Device index, rtsp:// URL or file path")
+        with cols[1]:
+            cam_zone = st.text_input("Zone", value=sim.get("zone", "North Gate"))
+            cam_stride = st.number_input("Frame Stride", min_value=1, value=2, step=1)
+        with cols[2]:
+            cam_area = st.number_input("Observed Area (m²)", min_value=1.0, value=100.0, step=1.0)
+            cam_mpp = st.number_input("Meters per Pixel", min_value=0.0001, value=0.02, step=0.005, format="%.4f")
+        if st.form_submit_button("Add Camera"):
+            if not cam_name.strip() or not cam_source.strip() or not cam_zone.strip():
+                st.error("Please provide a name, source and zone")
+            else:
+                try:
+                    add_camera(cam_name.strip(), cam_source.strip(), cam_zone.strip(),
+                               cam_area, cam_mpp, int(cam_stride))
+                except sqlite3.IntegrityError:
+                    st.error(f"A camera named '{cam_name}' already exists")
+                else:
+                    st.success(f"Camera '{cam_name}' added")
+
+    cameras = list_cameras(active_only=False)
+    readings = {row["zone"]: row for row in zone_density_summary(window_seconds=60)}
+    for camera in cameras:
+        cols = st.columns([3, 2, 2, 1])
+        cols[0].write(f"**{camera['name']}** · {camera['source']}")
+        cols[1].write(camera["zone"])
+        reading = readings.get(camera["zone"])
+        if reading:
+            velocity = reading["velocity_mean"]
+            cols[2].write(f"{reading['density_mean']:.2f}/m²"
+                          + (f" · {velocity:.2f} m/s" if velocity is not None else ""))
+        else:
+            cols[2].write("no recent samples")
+        active = cols[3].checkbox("Active", value=bool(camera["is_active"]), key=f"camera_active_{camera['id']}")
+        if active != bool(camera["is_active"]):
+            set_camera_active(camera["id"], active)
+
+
 def predictive_page():
     st.header("Predictive Bottleneck Analysis")
     sim = st.session_state.sim
+    # Load the shared detector in the background so the first estimate doesn't wait for it
+    preload_detector()
     with st.expander("Simulation Controls", expanded=True):
         sim["zone"] = st.text_input("Zone", value=sim.get("zone", "North Gate"))
         base_density = st.slider("Base Density (people/m²)", 0.2, 5.0, 2.5, 0.1)
@@ -115,6 +252,7 @@ def predictive_page():
             lc_mpp = st.number_input("Meters per Pixel", min_value=0.0001, value=0.02, step=0.005, format="%.4f", key="lc_mpp")
         with cols[3]:
             lc_stride = st.number_input("Frame Stride", min_value=1, value=2, step=1, key="lc_stride")
+        lc_flow = _flow_options("lc")
 
         if "local_cam" not in st.session_state:
             st.session_state.local_cam = {
@@ -136,71 +274,55 @@ def predictive_page():
         if stop_clicked:
             lc["running"] = False
 
+        if lc.get("pipeline") is not None and (start_clicked or stop_clicked):
+            # A previous run was interrupted by this click; make sure its workers are gone
+            lc.pop("pipeline").stop()
+
+        if lc.get("running") and lc_flow is None:
+            lc["running"] = False
         if lc.get("running"):
-            cap = cv2.VideoCapture(int(lc_index))
-            if not cap.isOpened():
+            pipeline = CameraPipeline(int(lc_index), float(lc_area_m2), float(lc_mpp), int(lc_stride),
+                                      flow=FlowEstimator(float(lc_mpp), **lc_flow))
+            if not pipeline.start():
                 st.error("Could not open camera. Try a different index.")
                 lc["running"] = False
             else:
-                yolo_model = YOLO("yolov8n.pt")
-                i = 0
+                lc["pipeline"] = pipeline
                 t_end = time.time() + 30
-                prev_gray = None
-                history = []
-                ema_count = 0.0
-                while lc.get("running") and time.time() < t_end:
-                    ok, frame = cap.read()
-                    if not ok:
-                        break
-                    if (i % int(lc_stride)) != 0:
-                        i += 1
-                        continue
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    rects = []
-                    res = yolo_model.predict(frame, conf=0.35, iou=0.45, imgsz=640, verbose=False)[0]
-                    if res and res.boxes is not None:
-                        b = res.boxes
-                        cls = b.cls.cpu().numpy().astype(int)
-                        xyxy = b.xyxy.cpu().numpy()
-                        for j in range(len(cls)):
-                            if cls[j] == 0:
-                                x1, y1, x2, y2 = xyxy[j]
-                                rects.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
-                    count = int(len(rects))
-                    if i == 0:
-                        ema_count = float(count)
-                    else:
-                        ema_count = 0.3 * float(count) + 0.7 * float(ema_count)
-                    density = count / max(float(lc_area_m2), 1e-6)
-                    lc["densities"].append(density)
-                    ts = time.time()
-                    history.append((ts, ema_count))
-                    cutoff = ts - 300.0
-                    history = [(t, c) for (t, c) in history if t >= cutoff]
-                    lc["count"] = int(ema_count)
-                    if len(history) >= 2:
-                        t0, c0 = history[0]
-                        t1, c1v = history[-1]
-                        dt = max(t1 - t0, 1e-3)
-                        lc["rate_per_hour"] = float(((c1v - c0) / dt) * 3600.0)
-                    if prev_gray is not None:
-                        flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-                        mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-                        mean_pix = float(np.nanmean(mag))
-                        fps = 15.0
-                        mps = mean_pix * float(lc_mpp) * fps
-                        lc["flows"].append(mps)
-                    prev_gray = gray
-                    for (x, y, w, h) in rects:
-                        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                    flows_buf = lc.get('flows', [])
-                    last_vel = flows_buf[-1] if flows_buf else 0.0
-                    hud = f"count={lc['count']} density={density:.2f}/m² vel={last_vel:.2f} m/s rate={lc['rate_per_hour']:.1f}/h"
-                    cv2.putText(frame, hud, (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-                    frame_ph.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), channels="RGB")
-                    time.sleep(0.03)
-                    i += 1
-                cap.release()
+                pending_samples = []
+                shown = 0
+                try:
+                    # Render on the script thread; capture, detection and flow run on the pipeline's workers
+                    while lc.get("running") and pipeline.running and time.time() < t_end:
+                        snap = pipeline.snapshot()
+                        pending_samples.extend(pipeline.drain_samples())
+                        if len(pending_samples) >= 30:
+                            add_density_samples(sim["zone"], pending_samples, source="camera")
+                            pending_samples = []
+                        if snap["seq"] == shown or snap["frame"] is None:
+                            time.sleep(0.01)
+                            continue
+                        shown = snap["seq"]
+                        lc["count"] = snap["count"]
+                        lc["rate_per_hour"] = snap["rate_per_hour"]
+                        lc["densities"].append(snap["density"])
+                        if snap["velocity"] is not None:
+                            lc["flows"].append(snap["velocity"])
+                        frame = snap["frame"].copy()
+                        for (x, y, w, h) in snap["rects"]:
+                            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                        last_vel = snap["velocity"] or 0.0
+                        stage_fps = snap["stage_fps"]
+                        hud = (f"count={lc['count']} density={snap['density']:.2f}/m² vel={last_vel:.2f} m/s "
+                               f"rate={lc['rate_per_hour']:.1f}/h "
+                               f"fps cap/det/flow={stage_fps['read']:.0f}/{stage_fps['detected']:.0f}/{stage_fps['flow']:.0f}")
+                        cv2.putText(frame, hud, (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+                        frame_ph.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), channels="RGB")
+                finally:
+                    pipeline.stop()
+                    lc.pop("pipeline", None)
+                    pending_samples.extend(pipeline.drain_samples())
+                    add_density_samples(sim["zone"], pending_samples, source="camera")
                 lc["running"] = False
     with st.expander("Camera-based Estimation", expanded=False):
         file = st.file_uploader("Upload crowd video (mp4/avi)", type=["mp4", "avi", "mov"], key="crowd_video")
@@ -211,16 +333,37 @@ def predictive_page():
             meters_per_pixel = st.number_input("Meters per Pixel", min_value=0.0001, value=0.02, step=0.005, format="%.4f")
         with cols[2]:
             frame_stride = st.number_input("Frame Stride", min_value=1, value=5, step=1)
-        max_frames = st.number_input("Max Frames", min_value=5, value=120, step=5)
-        if st.button("Estimate from Video") and file is not None:
+        cols = st.columns(2)
+        with cols[0]:
+            max_frames = st.number_input("Max Frames", min_value=5, value=120, step=5)
+        with cols[1]:
+            batch_size = st.number_input("Batch Size", min_value=1, value=VIDEO_BATCH_SIZE, step=1)
+        video_flow = _flow_options("video")
+        if st.button("Estimate from Video") and file is not None and video_flow is not None:
             bytes_data = file.read()
-            dens, vel = _estimate_from_video(bytes_data, float(area_m2), float(meters_per_pixel), int(frame_stride), int(max_frames))
+            dens, vel, stats = _estimate_from_video(bytes_data, float(area_m2), float(meters_per_pixel),
+                                                    int(frame_stride), int(max_frames), int(batch_size),
+                                                    video_flow)
+            st.caption(f"Analysed {stats['frames']} frames in {stats['seconds']:.1f}s ({stats['fps']:.1f} frames/s)")
             if len(dens) >= 5:
                 sim["density_series"] = dens
             sim["velocity"] = float(np.clip(vel, 0.0, 2.0))
             st.success(f"Estimated velocity: {sim['velocity']:.2f} m/s; mean density: {float(np.mean(sim['density_series'])):.2f} people/m²")
 
+    with st.expander("Cameras", expanded=False):
+        _cameras_panel(sim)
+
+    with st.expander("Stored History", expanded=False):
+        use_history = st.checkbox("Forecast from stored samples for this zone", value=False)
+        history_hours = st.slider("History Window (hours)", 1, 12, 2)
+
     series = sim["density_series"]
+    if use_history:
+        buckets = downsample_density_samples(sim["zone"], bucket_seconds=60, start_ts=time.time() - history_hours * 3600)
+        if len(buckets) >= 5:
+            series = np.array([b["density_mean"] for b in buckets], dtype=float)
+        else:
+            st.info(f"Not enough stored samples for {sim['zone']}; using the current series.")
     pred = forecast_next(series, steps=20)
 
     ts = np.concatenate([series, pred])
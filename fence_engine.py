@@ -0,0 +1,306 @@
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from entity_store import EntityStore
+from geodesy import haversine_m
+from geo_utils import (entity_coordinates, zone_bounds, zone_geometry, zone_polygon,
+                       points_in_polygon, polygon_edge_distance)
+from spatial_index import ZoneGridIndex
+
+# Roughly one meter of latitude in degrees; used for the "has it moved" test
+# (longitude is scaled by 1/cos(lat) where it is used).
+_DEG_PER_METER = 1.0 / 111320.0
+
+ALERTING_ZONE_TYPES = ("restricted", "danger")
+
+
+class _ZoneState:
+    """Membership of every entity in one zone, plus per-stay bookkeeping."""
+
+    def __init__(self, n: int):
+        self.inside = np.zeros(n, dtype=bool)
+        self.entered_at = np.full(n, np.nan)
+        self.dwell_alerted = np.zeros(n, dtype=bool)
+        self.over_threshold = False
+        self.count = 0
+        # Earliest entered_at among members not yet dwell-alerted (may be stale-low)
+        self.next_dwell = np.inf
+
+    def grow(self, n: int):
+        """Extend to n entities; the new ones start outside the zone."""
+        extra = n - len(self.inside)
+        if extra > 0:
+            self.inside = np.concatenate([self.inside, np.zeros(extra, dtype=bool)])
+            self.entered_at = np.concatenate([self.entered_at, np.full(extra, np.nan)])
+            self.dwell_alerted = np.concatenate([self.dwell_alerted, np.zeros(extra, dtype=bool)])
+
+
+class FenceEngine:
+    """
+    Stateful geo-fence evaluator.
+
+    Keeps per-entity-per-zone membership between ticks and only reports
+    transitions: ``unauthorized_entry``, ``zone_exit`` and ``dwell_exceeded``
+    for restricted/danger zones, and ``density_exceeded`` once when any
+    zone's head count crosses its threshold (re-armed after it falls back
+    below ``density_release`` of the threshold).
+
+    Membership uses hysteresis so an entity jittering on a boundary does not
+    flap: it enters once it is ``hysteresis_meters`` inside the circle or
+    polygon edge and only exits once it is ``hysteresis_meters`` outside it.
+    Each update only re-evaluates entities that moved more than
+    ``move_epsilon_meters`` since they were last evaluated (plus everyone,
+    for zones seen for the first time), and a ZoneGridIndex over the zone
+    boxes pairs each of them with just the zones it may be in, so work and
+    alert volume follow real movement, not crowd size or zone count.
+    Entities may be appended between updates (new ones start outside every
+    zone); a shrinking population resets the state.
+    """
+
+    def __init__(self, hysteresis_meters: float = 5.0, dwell_seconds: float = 300.0,
+                 move_epsilon_meters: float = 0.5, density_release: float = 0.9):
+        self.hysteresis_meters = hysteresis_meters
+        self.dwell_seconds = dwell_seconds
+        self.move_epsilon_meters = move_epsilon_meters
+        self.density_release = density_release
+        self._index = None
+        self._index_key = None
+        self._journal = None
+        self.reset()
+
+    def reset(self):
+        """Forget all membership state (e.g. when a new crowd is simulated)."""
+        if self._journal is not None:
+            # Reset swaps in fresh objects, so keeping the old references is enough
+            self._remember(self.__dict__.update, dict(self.__dict__))
+        self._zones: Dict[int, _ZoneState] = {}
+        self._last_lat = None
+        self._last_lng = None
+        self.changed = np.empty(0, dtype=np.int64)
+
+    def snapshot(self):
+        """
+        Mark the current state for restore() if the caller cannot keep the
+        next update. Nothing is copied: that update journals what it
+        overwrites, so the cost follows the entities and zones that change.
+        """
+        self._journal = []
+        return self._journal
+
+    def restore(self, snapshot):
+        """Undo the update that followed the snapshot() that returned this journal."""
+        while snapshot:
+            undo, args = snapshot.pop()
+            undo(*args)
+
+    def _remember(self, undo, *args):
+        if self._journal is not None:
+            self._journal.append((undo, args))
+
+    def _assign(self, array: np.ndarray, indices, values):
+        """array[indices] = values, journaled for restore()."""
+        if self._journal is not None:
+            self._journal.append((np.put, (array, indices, array[indices])))
+        array[indices] = values
+
+    def densities(self) -> Dict[int, int]:
+        """Current head count per zone id."""
+        return {zone_id: state.count for zone_id, state in self._zones.items()}
+
+    def _moved(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """
+        Indices of the entities to re-evaluate, advancing their remembered
+        positions. Everyone else keeps the position they were last evaluated
+        at, so slow drift accumulates until it crosses the epsilon.
+        """
+        n = len(lats)
+        if self._last_lat is None or len(self._last_lat) > n:
+            self.reset()
+            self._last_lat, self._last_lng = lats.copy(), lngs.copy()
+            return np.arange(n)
+        eps = self.move_epsilon_meters * _DEG_PER_METER
+        known = len(self._last_lat)
+        # A degree of longitude shrinks with cos(lat), so widen its epsilon to match
+        eps_lng = eps / np.maximum(np.cos(np.radians(self._last_lat)), 1e-6)
+        moved = np.flatnonzero((np.abs(lats[:known] - self._last_lat) > eps)
+                               | (np.abs(lngs[:known] - self._last_lng) > eps_lng))
+        self._assign(self._last_lat, moved, lats[moved])
+        self._assign(self._last_lng, moved, lngs[moved])
+        # Entities appended since the last update are always evaluated
+        if n > known:
+            self._remember(self.__dict__.update,
+                           {"_last_lat": self._last_lat, "_last_lng": self._last_lng})
+            self._last_lat = np.concatenate([self._last_lat, lats[known:]])
+            self._last_lng = np.concatenate([self._last_lng, lngs[known:]])
+        return np.concatenate([moved, np.arange(known, n)])
+
+    def update(self, entities, zones: List, now: float = None) -> List[Dict]:
+        """
+        Evaluate the entities (columnar store or list of dicts) against the
+        zones and return alert dicts for the transitions since the last call.
+        Indices of the entities that were re-evaluated are left in
+        ``self.changed``.
+        """
+        try:
+            return self._evaluate(entities, zones, time.time() if now is None else now)
+        finally:
+            # A snapshot covers one update; later ones are not journaled
+            self._journal = None
+
+    def _evaluate(self, entities, zones: List, now: float) -> List[Dict]:
+        lats, lngs = entity_coordinates(entities)
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        n = len(lats)
+        changed = self._moved(lats, lngs)
+        self._remember(setattr, self, "changed", self.changed)
+        self.changed = changed
+
+        # Drop state for zones that were removed or deactivated
+        zone_ids = [zone["id"] for zone in zones]
+        for zone_id in set(self._zones) - set(zone_ids):
+            self._remember(self._zones.__setitem__, zone_id, self._zones.pop(zone_id))
+        if not zones or not n:
+            return []
+
+        zone_lats, zone_lngs, radii = zone_geometry(zones)
+        is_new = np.array([zone["id"] not in self._zones for zone in zones])
+        # (entity, zone) pairs worth an exact test: moved entities against the
+        # zones whose box they fall in, everyone against zones seen for the first time
+        index = self._zone_index(zones)
+        points, zone_idx = index.candidates(lats[changed], lngs[changed])
+        keep = ~is_new[zone_idx]
+        points, zone_idx = changed[points[keep]], zone_idx[keep]
+        if is_new.any():
+            all_points, all_zones = index.candidates(lats, lngs)
+            keep = is_new[all_zones]
+            points = np.concatenate([points, all_points[keep]])
+            zone_idx = np.concatenate([zone_idx, all_zones[keep]])
+            order = np.argsort(zone_idx, kind="stable")
+            points, zone_idx = points[order], zone_idx[order]
+        bounds = np.searchsorted(zone_idx, np.arange(len(zones) + 1))
+
+        alerts = []
+        for z, (zone, zlat, zlng, r) in enumerate(zip(zones, zone_lats, zone_lngs, radii)):
+            state = self._zones.get(zone["id"])
+            if state is None:
+                state = self._zones[zone["id"]] = _ZoneState(n)
+                self._remember(self._zones.pop, zone["id"])
+            else:
+                # Scalars and array references; grow() replaces the arrays
+                self._remember(state.__dict__.update, dict(state.__dict__))
+                state.grow(n)
+            near = points[bounds[z]:bounds[z + 1]]
+            outer, inner = self._membership(zone, lats[near], lngs[near], zlat, zlng, r)
+            was_inside = state.inside[near]
+            entered = near[~was_inside & inner]
+            exited = near[was_inside & ~outer]
+            if not is_new[z] and len(changed):
+                # Moved members that left the zone's box are not candidates at all
+                members = changed[state.inside[changed]]
+                exited = np.union1d(exited, np.setdiff1d(members, near))
+
+            self._assign(state.inside, entered, True)
+            self._assign(state.entered_at, entered, now)
+            self._assign(state.inside, exited, False)
+            self._assign(state.entered_at, exited, np.nan)
+            self._assign(state.dwell_alerted, exited, False)
+            state.count += len(entered) - len(exited)
+            if len(entered):
+                state.next_dwell = min(state.next_dwell, now)
+
+            alerts.extend(self._check_zone(zone, state, entities, now, entered, exited))
+        return alerts
+
+    def _zone_index(self, zones: List) -> ZoneGridIndex:
+        """Box index over the zones, widened by the hysteresis; rebuilt when they change."""
+        key = tuple((zone["id"], zone["center_lat"], zone["center_lng"], zone["radius_meters"],
+                     zone["vertices"] if "vertices" in zone.keys() else None) for zone in zones)
+        if key != self._index_key:
+            self._index = ZoneGridIndex(*zone_bounds(zones, self.hysteresis_meters))
+            self._index_key = key
+        return self._index
+
+    def _membership(self, zone, lats: np.ndarray, lngs: np.ndarray, zlat: float, zlng: float,
+                    r: float):
+        """(outer, inner) masks: within the zone plus / minus the hysteresis margin."""
+        h = self.hysteresis_meters
+        if not len(lats):
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+        polygon = zone_polygon(zone)
+        if polygon is None:
+            dist = haversine_m(lats, lngs, zlat, zlng)
+            return dist <= r + h, dist <= max(r - h, 0.0)
+        in_polygon = points_in_polygon(lats, lngs, polygon)
+        edge = polygon_edge_distance(lats, lngs, polygon)
+        return in_polygon | (edge <= h), in_polygon & (edge >= h)
+
+    def _check_zone(self, zone, state: _ZoneState, entities, now: float,
+                    entered, exited) -> List[Dict]:
+        alerts = []
+        density = state.count
+        density_threshold = 100  # Default value
+        if 'density_threshold' in zone.keys() and zone['density_threshold'] is not None:
+            density_threshold = zone['density_threshold']
+        if density > density_threshold and not state.over_threshold:
+            state.over_threshold = True
+            alerts.append({
+                'zone_id': zone['id'],
+                'alert_type': 'density_exceeded',
+                'message': f"Density threshold exceeded in {zone['name']}: {density} people",
+                'severity': 'high' if density > density_threshold * 1.5 else 'medium'
+            })
+        elif state.over_threshold and density <= density_threshold * self.density_release:
+            state.over_threshold = False
+
+        if zone['zone_type'] not in ALERTING_ZONE_TYPES:
+            return alerts
+
+        severity = 'critical' if zone['zone_type'] == 'danger' else 'high'
+        for idx in entered:
+            entity = _entity_fields(entities, idx)
+            alerts.append(_entity_alert(
+                zone, entity, 'unauthorized_entry', severity,
+                f"{entity['name']} entered {zone['name']} ({zone['zone_type']} zone)"))
+        for idx in exited:
+            entity = _entity_fields(entities, idx)
+            alerts.append(_entity_alert(
+                zone, entity, 'zone_exit', 'low',
+                f"{entity['name']} left {zone['name']} ({zone['zone_type']} zone)"))
+
+        if now - state.next_dwell < self.dwell_seconds:
+            return alerts
+        pending = state.inside & ~state.dwell_alerted
+        overdue = np.flatnonzero(pending & (now - state.entered_at >= self.dwell_seconds))
+        self._assign(state.dwell_alerted, overdue, True)
+        pending[overdue] = False
+        state.next_dwell = state.entered_at[pending].min() if pending.any() else np.inf
+        minutes = self.dwell_seconds / 60
+        for idx in overdue:
+            entity = _entity_fields(entities, idx)
+            alerts.append(_entity_alert(
+                zone, entity, 'dwell_exceeded', severity,
+                f"{entity['name']} has been in {zone['name']} for over {minutes:g} min"))
+        return alerts
+
+
+def _entity_fields(entities, idx) -> Dict:
+    """id/name/lat/lng of one entity without building the full record."""
+    if isinstance(entities, EntityStore):
+        return {'id': entities.entity_id(idx), 'name': entities.name(idx),
+                'lat': float(entities.lat[idx]), 'lng': float(entities.lng[idx])}
+    return entities[idx]
+
+
+def _entity_alert(zone, entity: Dict, alert_type: str, severity: str, message: str) -> Dict:
+    return {
+        'zone_id': zone['id'],
+        'alert_type': alert_type,
+        'entity_id': entity['id'],
+        'entity_lat': entity['lat'],
+        'entity_lng': entity['lng'],
+        'message': message,
+        'severity': severity,
+    }
@@ -0,0 +1,125 @@
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+FLOW_METHODS = ("farneback", "lucas_kanade")
+
+
+def parse_roi(text: str) -> Optional[np.ndarray]:
+    """'x,y; x,y; ...' pixel polygon (at least three points) or None for blank text."""
+    points = [tuple(float(v) for v in part.split(",")) for part in text.replace("\n", ";").split(";")
+              if part.strip()]
+    if not points:
+        return None
+    if len(points) < 3 or any(len(p) != 2 for p in points):
+        raise ValueError("An ROI needs at least three 'x,y' points")
+    return np.array(points, dtype=np.float64)
+
+
+class FlowEstimator:
+    """
+    Crowd velocity (m/s) from consecutive frames.
+
+    Frames are reduced with ``pyrDown`` until they are at most ``max_width``
+    pixels wide (``level`` halvings), converted to grayscale and cropped to
+    the bounding box of the optional region of interest, so dense
+    Farnebäck flow only runs on the walkway at a fraction of the full
+    resolution. ``meters_per_pixel`` is given for full-resolution frames and
+    scaled by 2**level internally. With ``method="lucas_kanade"`` and person
+    centroids supplied, sparse pyramidal Lucas–Kanade tracks just those
+    points instead; without points it falls back to dense flow.
+    """
+
+    def __init__(self, meters_per_pixel: float, max_width: int = 480, roi: np.ndarray = None,
+                 method: str = "farneback"):
+        if method not in FLOW_METHODS:
+            raise ValueError(f"Unknown flow method: {method}")
+        self.meters_per_pixel = float(meters_per_pixel)
+        self.max_width = int(max_width)
+        self.roi = None if roi is None else np.asarray(roi, dtype=np.float64)
+        self.method = method
+        self.level = None
+        self._crop = None
+        self._mask = None
+
+    def _setup(self, shape: Tuple[int, ...]):
+        height, width = shape[:2]
+        level = 0
+        while (width >> level) > self.max_width:
+            level += 1
+        self.level = level
+        h, w = -(-height // 2 ** level), -(-width // 2 ** level)
+        if self.roi is None:
+            self._crop = (slice(0, h), slice(0, w))
+            self._mask = None
+            return
+        pts = self.roi / 2 ** level
+        x0, y0 = np.clip(np.floor(pts.min(axis=0)).astype(int), 0, [w - 1, h - 1])
+        x1, y1 = np.clip(np.ceil(pts.max(axis=0)).astype(int) + 1, 1, [w, h])
+        self._crop = (slice(y0, y1), slice(x0, x1))
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.round(pts - [x0, y0]).astype(np.int32)], 1)
+        self._mask = mask.astype(bool)
+
+    def prepare(self, frame: np.ndarray) -> np.ndarray:
+        """Downscaled, ROI-cropped grayscale image to pass to estimate()."""
+        if self.level is None:
+            self._setup(frame.shape)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        for _ in range(self.level):
+            gray = cv2.pyrDown(gray)
+        return np.ascontiguousarray(gray[self._crop])
+
+    @property
+    def scaled_meters_per_pixel(self) -> float:
+        return self.meters_per_pixel * 2 ** (self.level or 0)
+
+    def estimate(self, prev: np.ndarray, cur: np.ndarray, dt: float,
+                 points: Sequence[Tuple[float, float]] = None) -> Optional[float]:
+        """
+        Mean speed in m/s between two prepared images taken dt seconds apart.
+        points are full-resolution (x, y) positions, e.g. person centroids,
+        used by the Lucas–Kanade method. None if nothing could be tracked.
+        """
+        if prev.shape != cur.shape or dt <= 0:
+            return None
+        if self.method == "lucas_kanade" and points is not None and len(points):
+            pix = self._sparse(prev, cur, points)
+        else:
+            pix = self._dense(prev, cur)
+        if pix is None:
+            return None
+        return pix * self.scaled_meters_per_pixel / dt
+
+    def _dense(self, prev, cur) -> Optional[float]:
+        flow = cv2.calcOpticalFlowFarneback(prev, cur, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+        mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+        if self._mask is not None:
+            mag = mag[self._mask]
+        return float(np.nanmean(mag)) if mag.size else None
+
+    def _sparse(self, prev, cur, points) -> Optional[float]:
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 2) / 2 ** self.level
+        pts -= [self._crop[1].start, self._crop[0].start]
+        h, w = prev.shape
+        inside = (pts[:, 0] >= 0) & (pts[:, 0] < w) & (pts[:, 1] >= 0) & (pts[:, 1] < h)
+        if self._mask is not None:
+            cols = np.clip(pts[:, 0].astype(int), 0, w - 1)
+            rows = np.clip(pts[:, 1].astype(int), 0, h - 1)
+            inside &= self._mask[rows, cols]
+        pts = pts[inside]
+        if not len(pts):
+            return None
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev, cur, pts.reshape(-1, 1, 2), None,
+                                                    winSize=(15, 15), maxLevel=2)
+        ok = status.ravel() == 1
+        if not ok.any():
+            return None
+        return float(np.median(np.linalg.norm(moved.reshape(-1, 2)[ok] - pts[ok], axis=1)))
+
+
+def box_centroids(rects) -> np.ndarray:
+    """Centers of (x, y, w, h) boxes as a float (n, 2) array."""
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    return rects[:, :2] + rects[:, 2:] / 2
@@ -6,8 +6,203 @@ from datetime import datetime, timedelta
 
 import folium
 from folium import plugins
+import numpy as np
 import streamlit as st
 
+from density_grid import DensityGrid
+from entity_store import EntityStore
+from geodesy import EARTH_RADIUS_M, haversine_m, haversine_matrix, haversine_terms
+from maps import blueprint_image_url, cached_layer, get_current_event_blueprint
+from spatial_index import EntityGridIndex
+
+
+def zone_membership(entity_lats, entity_lngs, zone_lats, zone_lngs, zone_radii,
+                    with_distances: bool = True):
+    """
+    Test every entity against every circular zone in one vectorized call.
+    Returns (mask, distances), both shaped zones x entities; mask[z, e] is
+    True when entity e lies inside zone z. With with_distances=False the
+    distance matrix is skipped (returned as None) and the radius test is done
+    on the haversine term directly, which is cheaper.
+    """
+    radii = np.asarray(zone_radii, dtype=np.float64)
+    if with_distances:
+        distances = haversine_matrix(zone_lats, zone_lngs, entity_lats, entity_lngs)
+        return distances <= radii[:, None], distances
+    a = haversine_terms(zone_lats, zone_lngs, entity_lats, entity_lngs, pairwise=True)
+    # distance <= r  <=>  a <= sin^2(r / 2R) for distances under half the globe
+    limit = np.sin(np.clip(radii / (2 * EARTH_RADIUS_M), 0.0, np.pi / 2)) ** 2
+    return a <= limit[:, None], None
+
+
+def entity_coordinates(entities: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Latitude and longitude arrays for a columnar store (EntityStore or any
+    object exposing ``lat``/``lng`` arrays) or a list of entity dicts.
+    """
+    if isinstance(getattr(entities, "lat", None), np.ndarray):
+        return entities.lat, entities.lng
+    lats = np.fromiter((e["lat"] for e in entities), dtype=np.float64, count=len(entities))
+    lngs = np.fromiter((e["lng"] for e in entities), dtype=np.float64, count=len(entities))
+    return lats, lngs
+
+
+def zone_geometry(zones: List) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Center latitude, center longitude and radius arrays for a list of zones."""
+    lats = np.array([z["center_lat"] for z in zones], dtype=np.float64)
+    lngs = np.array([z["center_lng"] for z in zones], dtype=np.float64)
+    radii = np.array([z["radius_meters"] for z in zones], dtype=np.float64)
+    return lats, lngs, radii
+
+
+def zone_polygon(zone) -> Optional[np.ndarray]:
+    """(k, 2) array of (lat, lng) vertices for a polygon zone, None for circles."""
+    if "shape" not in zone.keys() or zone["shape"] != "polygon" or not zone["vertices"]:
+        return None
+    return np.frombuffer(zone["vertices"], dtype=np.float64).reshape(-1, 2)
+
+
+def zone_bounds(zones: List, margin_m: float = 0.0) -> Tuple[np.ndarray, ...]:
+    """
+    (south, west, north, east) degree arrays bounding each zone, widened by
+    margin_m: the circle of a circular zone, the vertices of a polygon zone.
+    """
+    bounds = np.empty((4, len(zones)), dtype=np.float64)
+    m_per_deg = np.radians(1.0) * EARTH_RADIUS_M
+    for i, zone in enumerate(zones):
+        polygon = zone_polygon(zone)
+        if polygon is not None:
+            (south, west), (north, east) = polygon.min(axis=0), polygon.max(axis=0)
+            pad = margin_m
+        else:
+            south = north = zone["center_lat"]
+            west = east = zone["center_lng"]
+            pad = zone["radius_meters"] + margin_m
+        dlat = pad / m_per_deg
+        # Widest longitude span at the box edge farthest from the equator
+        dlng = dlat / max(np.cos(np.radians(max(abs(south), abs(north)) + dlat)), 1e-6)
+        bounds[:, i] = south - dlat, west - dlng, north + dlat, east + dlng
+    return tuple(bounds)
+
+
+def points_in_polygon(lats, lngs, vertices: np.ndarray) -> np.ndarray:
+    """
+    Even-odd point-in-polygon test for many points against one polygon.
+    Points outside the polygon's bounding box are rejected up front; the
+    crossing test then loops over the k edges, each vectorized over the
+    remaining points, so cost is O(k * points in bbox).
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    inside = np.zeros(len(lats), dtype=bool)
+    vlat, vlng = vertices[:, 0], vertices[:, 1]
+    candidates = np.flatnonzero((lats >= vlat.min()) & (lats <= vlat.max())
+                                & (lngs >= vlng.min()) & (lngs <= vlng.max()))
+    if not len(candidates):
+        return inside
+    y, x = lats[candidates], lngs[candidates]
+    crossings = np.zeros(len(candidates), dtype=bool)
+    for (y1, x1), (y2, x2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if y1 == y2:
+            continue  # horizontal edges never cross the ray
+        straddles = (y1 > y) != (y2 > y)
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        crossings ^= straddles & (x < x_cross)
+    inside[candidates] = crossings
+    return inside
+
+
+def polygon_edge_distance(lats, lngs, vertices: np.ndarray) -> np.ndarray:
+    """
+    Distance in meters from each point to the nearest polygon edge, on a
+    local equirectangular projection around the first vertex (accurate to
+    well under a percent at venue scale).
+    """
+    lat0 = np.radians(vertices[0, 0])
+    scale = np.array([EARTH_RADIUS_M, EARTH_RADIUS_M * np.cos(lat0)])
+    verts = np.radians(vertices) * scale
+    points = np.radians(np.column_stack([np.asarray(lats, dtype=np.float64),
+                                         np.asarray(lngs, dtype=np.float64)])) * scale
+    best = np.full(len(points), np.inf)
+    for a, b in zip(verts, np.roll(verts, -1, axis=0)):
+        ab = b - a
+        denom = float(ab @ ab) or 1.0
+        t = np.clip((points - a) @ ab / denom, 0.0, 1.0)
+        d = np.hypot(*(points - a - t[:, None] * ab).T)
+        np.minimum(best, d, out=best)
+    return best
+
+
+def simplify_track(track: List[Tuple], tolerance_meters: float = 5.0) -> List[Tuple]:
+    """
+    Douglas-Peucker simplification of a (ts, lat, lng) track: keeps the
+    endpoints and every point that deviates more than tolerance_meters from
+    the simplified line. Distances are measured on a local equirectangular
+    projection and each split is vectorized over its span.
+    """
+    if len(track) < 3:
+        return list(track)
+    points = np.asarray(track, dtype=np.float64)
+    lat0 = np.radians(points[0, 1])
+    xy = np.radians(points[:, 1:3]) * np.array([EARTH_RADIUS_M, EARTH_RADIUS_M * np.cos(lat0)])
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        ab = b - a
+        span = xy[start + 1:end] - a
+        length = np.hypot(*ab)
+        if length > 0:
+            dist = np.abs(ab[0] * span[:, 1] - ab[1] * span[:, 0]) / length
+        else:
+            dist = np.hypot(span[:, 0], span[:, 1])
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_meters:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return [track[i] for i in np.flatnonzero(keep)]
+
+
+def zone_membership_for(entities: List[Dict], zones: List) -> np.ndarray:
+    """zones x entities membership mask for entity dicts and zone rows."""
+    if not entities or not zones:
+        return np.zeros((len(zones), len(entities)), dtype=bool)
+    lats, lngs = entity_coordinates(entities)
+    mask, _ = zone_membership(lats, lngs, *zone_geometry(zones), with_distances=False)
+    for i, zone in enumerate(zones):
+        polygon = zone_polygon(zone)
+        if polygon is not None:
+            mask[i] = points_in_polygon(lats, lngs, polygon)
+    return mask
+
+
+def zone_members(entities: List[Dict], zones: List) -> List[np.ndarray]:
+    """
+    Indices of the entities inside each zone, via a grid index built once for
+    the tick. Each zone only examines entities in the cells its (enclosing)
+    circle overlaps, so cost scales with the local crowd rather than the venue.
+    """
+    if not entities or not zones:
+        return [np.empty(0, dtype=np.int64) for _ in zones]
+    lats, lngs = entity_coordinates(entities)
+    zone_lats, zone_lngs, radii = zone_geometry(zones)
+    index = EntityGridIndex(lats, lngs, cell_meters=max(10.0, float(np.median(radii)) / 2))
+    members = []
+    for zone, lat, lng, r in zip(zones, zone_lats, zone_lngs, radii):
+        inside = index.query_radius(lat, lng, r)
+        polygon = zone_polygon(zone)
+        if polygon is not None:
+            # The enclosing circle is only a prefilter for polygon zones
+            inside = inside[points_in_polygon(lats[inside], lngs[inside], polygon)]
+        members.append(inside)
+    return members
+
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
@@ -15,18 +210,7 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     on the earth (specified in decimal degrees)
     Returns distance in meters
     """
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    # Radius of earth in meters
-    r = 6371000
-    return c * r
+    return haversine_m(lat1, lon1, lat2, lon2)
 
 
 def is_point_in_circle(point_lat: float, point_lng: float, 
@@ -95,38 +279,80 @@ def calculate_zone_density(entities: List[Dict], zone_center_lat: float,
     Calculate crowd density in a zone
     Returns number of entities within the zone
     """
-    count = 0
-    for entity in entities:
-        if is_point_in_circle(entity["lat"], entity["lng"], 
-                            zone_center_lat, zone_center_lng, zone_radius):
-            count += 1
-    return count
+    if not entities:
+        return 0
+    mask, _ = zone_membership(*entity_coordinates(entities),
+                              [zone_center_lat], [zone_center_lng], [zone_radius],
+                              with_distances=False)
+    return int(mask.sum())
+
+
+def calculate_zone_densities(entities: List[Dict], zones: List) -> List[int]:
+    """
+    Calculate crowd density for every zone in one pass
+    Returns entity counts in the same order as zones
+    """
+    return [len(members) for members in zone_members(entities, zones)]
+
+
+def entity_density_grid(entities: List[Dict], cell_meters: float = 5.0,
+                        sigma_cells: float = 0.0) -> DensityGrid:
+    """Bin entity positions into a DensityGrid (one pass per tick)."""
+    return DensityGrid(*entity_coordinates(entities), cell_meters=cell_meters,
+                       sigma_cells=sigma_cells)
+
+
+def zone_cells(grid: DensityGrid, zone):
+    """
+    (row slice, col slice, mask) of the grid cells whose centers fall inside
+    the zone. Polygon zones are windowed by their vertex bounding box, circles
+    by their radius; a row with neither raises ValueError.
+    """
+    polygon = zone_polygon(zone)
+    if polygon is not None:
+        (south, west), (north, east) = polygon.min(axis=0), polygon.max(axis=0)
+        rows, cols = grid.box_window(south, west, north, east)
+        lat, lng = grid.cell_centers()
+        inside = points_in_polygon(lat[rows, cols].ravel(), lng[rows, cols].ravel(), polygon)
+        return rows, cols, inside.reshape(lat[rows, cols].shape)
+    if 'radius_meters' not in zone.keys() or zone['radius_meters'] is None:
+        raise ValueError(f"Zone {zone['id']} has neither polygon vertices nor a radius")
+    return grid.circle_window(zone['center_lat'], zone['center_lng'], zone['radius_meters'])
+
+
+def grid_zone_stats(grid: DensityGrid, zones: List) -> List[Dict]:
+    """Point count, weight sum and weight max per zone, read from grid cells."""
+    stats = []
+    for zone in zones:
+        rows, cols, mask = zone_cells(grid, zone)
+        counts = grid.counts[rows, cols][mask]
+        occupied = counts > 0
+        stats.append({
+            'count': int(counts.sum()),
+            'weight_sum': float(grid.weight_sum[rows, cols][mask].sum()),
+            'weight_max': float(grid.weight_max[rows, cols][mask][occupied].max()) if occupied.any() else 0.0,
+        })
+    return stats
+
+
+def grid_zone_densities(grid: DensityGrid, zones: List) -> List[int]:
+    """
+    Entity counts per zone at grid resolution (cells whose center is inside
+    the zone). For exact counts, e.g. when alerting, use zone_members.
+    """
+    return [s['count'] for s in grid_zone_stats(grid, zones)]
 
 
 def create_geo_fence_map(zones: List, entities: List[Dict] = None, 
                         alerts: List[Dict] = None, center_lat: float = 28.6139, 
                         center_lng: float = 77.2090, use_blueprint: bool = True) -> folium.Map:
     """
-    Create an interactive map with geo-fenced zones, entities, and alerts
+    Create an interactive map with geo-fenced zones, entities, and alerts.
+    The blueprint image and zone geometry are cached until the blueprint or
+    the zones change; entities and alerts are drawn fresh on every call.
     """
     # Try to get blueprint for current event
-    blueprint = None
-    if use_blueprint:
-        try:
-            import streamlit as st
-            from db import list_events_by_user, get_blueprint_by_event
-            
-            user_id = st.session_state.auth.get("user_id")
-            current_event_name = st.session_state.get("current_event")
-            
-            if user_id and current_event_name:
-                events = list_events_by_user(user_id)
-                for event in events:
-                    if event['event_name'] == current_event_name:
-                        blueprint = get_blueprint_by_event(event['id'])
-                        break
-        except Exception:
-            pass
+    blueprint = get_current_event_blueprint() if use_blueprint else None
     
     # Create base map
     if blueprint and blueprint['venue_bounds_north']:
@@ -143,7 +369,8 @@ def create_geo_fence_map(zones: List, entities: List[Dict] = None,
         m = folium.Map(
             location=[bounds["center_lat"], bounds["center_lng"]],
             zoom_start=16,
-            tiles=None
+            tiles=None,
+            prefer_canvas=True
         )
         
         # Add blueprint overlay
@@ -153,7 +380,7 @@ def create_geo_fence_map(zones: List, entities: List[Dict] = None,
         ]
         
         img_overlay = folium.raster_layers.ImageOverlay(
-            image=blueprint['file_path'],
+            image=blueprint_image_url(blueprint),
             bounds=blueprint_bounds,
             opacity=0.7,
             interactive=True,
@@ -165,40 +392,123 @@ def create_geo_fence_map(zones: List, entities: List[Dict] = None,
         m = folium.Map(
             location=[center_lat, center_lng],
             zoom_start=15,
-            tiles='OpenStreetMap'
+            tiles='OpenStreetMap',
+            prefer_canvas=True
         )
     
     # Add zones
+    if zones:
+        add_zone_layer(m, zones)
+    
+    # Add entities and alerts (if provided)
+    if entities:
+        add_entity_layer(m, entities)
+    if alerts:
+        add_alert_layer(m, alerts)
+    
+    return m
+
+
+def _zones_key(zones: List) -> int:
+    """Fingerprint of the zone rows' contents, so any edit invalidates cached layers."""
+    return hash(tuple(tuple(zone[k] for k in zone.keys()) for zone in zones))
+
+
+def zone_features(zones: List) -> Tuple[Dict, Dict]:
+    """
+    GeoJSON FeatureCollections of the zone shapes and of the zone centers,
+    with colors and popup labels carried in the feature properties. Circle
+    zones are Point features whose ``radius`` (meters) is applied by the
+    client, so they cost one coordinate pair instead of a polygon ring.
+    """
+    shapes, centers = [], []
     for zone in zones:
-        zone_lat = zone['center_lat']
-        zone_lng = zone['center_lng']
-        radius = zone['radius_meters']
-        
-        # Create circle for zone
         color = get_zone_color(zone['zone_type'])
         icon = get_zone_icon(zone['zone_type'])
-        
-        folium.Circle(
-            location=[zone_lat, zone_lng],
-            radius=radius,
-            popup=f"{icon} {zone['name']}<br>Type: {zone['zone_type']}<br>Radius: {radius}m",
-            color=color,
-            weight=3,
-            fill=True,
-            fillColor=color,
-            fillOpacity=0.3
-        ).add_to(m)
-        
-        # Add zone center marker
-        folium.Marker(
-            location=[zone_lat, zone_lng],
-            popup=f"{icon} {zone['name']}",
-            icon=folium.Icon(color='white', icon_color=color, icon='circle', prefix='fa')
-        ).add_to(m)
-    
-    # Add entities (if provided)
-    if entities:
-        for entity in entities:
+        center = [zone['center_lng'], zone['center_lat']]
+        polygon = zone_polygon(zone)
+        if polygon is not None:
+            ring = polygon[:, ::-1].tolist()
+            geometry = {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+            detail = f"Vertices: {len(polygon)}"
+        else:
+            geometry = {"type": "Point", "coordinates": center}
+            detail = f"Radius: {zone['radius_meters']}m"
+        shapes.append({
+            "type": "Feature",
+            "id": str(zone['id']),
+            "geometry": geometry,
+            "properties": {"label": f"{icon} {zone['name']}<br>Type: {zone['zone_type']}<br>{detail}",
+                           "color": color, "radius": zone['radius_meters']},
+        })
+        centers.append({
+            "type": "Feature",
+            "id": str(zone['id']),
+            "geometry": {"type": "Point", "coordinates": center},
+            "properties": {"label": f"{icon} {zone['name']}", "color": color},
+        })
+    return ({"type": "FeatureCollection", "features": shapes},
+            {"type": "FeatureCollection", "features": centers})
+
+
+def add_zone_layer(m: folium.Map, zones: List):
+    """
+    Draw the zones as two GeoJSON layers (shapes and center points). The
+    feature collections are cached per zone set, so reruns that only move
+    entities reuse them, and the map renders two layers instead of a circle
+    and a marker per zone.
+    """
+    shapes, centers = cached_layer(("zones", _zones_key(zones)), lambda: zone_features(zones))
+    folium.GeoJson(
+        shapes,
+        name="Zones",
+        style_function=lambda f: {"color": f["properties"]["color"],
+                                  "fillColor": f["properties"]["color"],
+                                  "radius": f["properties"]["radius"]},
+        marker=folium.Circle(weight=3, fill=True, fill_opacity=0.3),
+        popup=folium.GeoJsonPopup(fields=["label"], labels=False),
+    ).add_to(m)
+    folium.GeoJson(
+        centers,
+        name="Zone centers",
+        style_function=lambda f: {"color": f["properties"]["color"],
+                                  "fillColor": f["properties"]["color"]},
+        marker=folium.CircleMarker(radius=6, weight=2, fill=True, fill_opacity=1.0),
+        popup=folium.GeoJsonPopup(fields=["label"], labels=False),
+    ).add_to(m)
+
+
+# Level-of-detail thresholds for entity rendering: individual markers up to
+# ENTITY_MARKER_LIMIT, client-side clusters up to ENTITY_CLUSTER_LIMIT and
+# a grid of counted cells beyond that.
+ENTITY_MARKER_LIMIT = 500
+ENTITY_CLUSTER_LIMIT = 20000
+ENTITY_GRID_MAX_CELLS = 2500
+ALERT_CLUSTER_LIMIT = 50
+
+# Client-side marker for FastMarkerCluster rows of [lat, lng, id]
+_ENTITY_CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 5, color: 'blue', fillColor: 'blue', fillOpacity: 0.7});
+    marker.bindPopup('ID: ' + row[2]);
+    return marker;
+}
+"""
+
+
+def add_entity_layer(m: folium.Map, entities) -> str:
+    """
+    Draw entities at a level of detail suited to their number and return the
+    mode used ('markers', 'clusters' or 'grid'). Only the marker mode builds
+    per-entity popup HTML; clusters ship [lat, lng, id] rows that the
+    browser renders itself, and the grid mode sends one GeoJSON square per
+    occupied cell.
+    """
+    n = len(entities)
+    if n <= ENTITY_MARKER_LIMIT:
+        for i in range(n):
+            entity = entities[i]
             folium.CircleMarker(
                 location=[entity['lat'], entity['lng']],
                 radius=5,
@@ -208,37 +518,96 @@ def create_geo_fence_map(zones: List, entities: List[Dict] = None,
                 fillColor='blue',
                 fillOpacity=0.7
             ).add_to(m)
-    
-    # Add alert markers (if provided)
-    if alerts:
-        for alert in alerts:
-            if alert['entity_lat'] and alert['entity_lng']:
-                severity_color = {
-                    'low': 'green',
-                    'medium': 'orange', 
-                    'high': 'red',
-                    'critical': 'darkred'
-                }.get(alert['severity'], 'orange')
-                
-                folium.Marker(
-                    location=[alert['entity_lat'], alert['entity_lng']],
-                    popup=f"🚨 Alert: {alert['message']}<br>Severity: {alert['severity']}",
-                    icon=folium.Icon(color=severity_color, icon='exclamation-triangle', prefix='fa')
-                ).add_to(m)
-    
+        return 'markers'
+
+    lats, lngs = entity_coordinates(entities)
+    if n <= ENTITY_CLUSTER_LIMIT:
+        if isinstance(entities, EntityStore):
+            ids = [entities.entity_id(i) for i in range(n)]
+        else:
+            ids = [entities[i]['id'] for i in range(n)]
+        rows = [[lat, lng, entity_id] for lat, lng, entity_id in zip(lats.tolist(), lngs.tolist(), ids)]
+        plugins.FastMarkerCluster(rows, callback=_ENTITY_CLUSTER_CALLBACK, name="Entities").add_to(m)
+        return 'clusters'
+
+    # Cell size chosen so the occupied cells stay under ENTITY_GRID_MAX_CELLS
+    extent = max(float(np.ptp(lats)) * 111320.0,
+                 float(np.ptp(lngs)) * 111320.0 * math.cos(math.radians(float(lats.mean()))))
+    cell = max(10.0, extent / math.sqrt(ENTITY_GRID_MAX_CELLS))
+    grid = DensityGrid(lats, lngs, cell_meters=cell)
+    rows, cols = np.nonzero(grid.counts)
+    counts = grid.counts[rows, cols]
+    peak = float(counts.max())
+    features = []
+    for south, west, north, east, count in zip(*(a.tolist() for a in grid.cell_bounds(rows, cols)),
+                                               counts.tolist()):
+        ring = [[west, south], [east, south], [east, north], [west, north], [west, south]]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {"count": int(count), "opacity": round(0.15 + 0.7 * count / peak, 2)},
+        })
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Entity density",
+        style_function=lambda f: {"color": "blue", "weight": 0, "fillColor": "blue",
+                                  "fillOpacity": f["properties"]["opacity"]},
+        tooltip=folium.GeoJsonTooltip(fields=["count"], aliases=["Entities"]),
+    ).add_to(m)
+    return 'grid'
+
+
+def add_alert_layer(m: folium.Map, alerts: List[Dict]):
+    """Alert markers; clustered once there are more than ALERT_CLUSTER_LIMIT."""
+    target = plugins.MarkerCluster(name="Alerts").add_to(m) if len(alerts) > ALERT_CLUSTER_LIMIT else m
+    for alert in alerts:
+        if alert['entity_lat'] and alert['entity_lng']:
+            severity_color = {
+                'low': 'green',
+                'medium': 'orange', 
+                'high': 'red',
+                'critical': 'darkred'
+            }.get(alert['severity'], 'orange')
+            
+            folium.Marker(
+                location=[alert['entity_lat'], alert['entity_lng']],
+                popup=f"🚨 Alert: {alert['message']}<br>Severity: {alert['severity']}",
+                icon=folium.Icon(color=severity_color, icon='exclamation-triangle', prefix='fa')
+            ).add_to(target)
+
+
+def create_trajectory_map(tracks: Dict[str, List[Tuple]], center_lat: float, center_lng: float,
+                          tolerance_meters: float = 5.0, max_tracks: int = 200) -> folium.Map:
+    """
+    Map of movement tracks ({entity_id: [(ts, lat, lng), ...]}), each
+    simplified with simplify_track before drawing. The current position is
+    marked at the end of every track.
+    """
+    m = folium.Map(location=[center_lat, center_lng], zoom_start=16, tiles='OpenStreetMap',
+                   prefer_canvas=True)
+    for entity_id, track in list(tracks.items())[:max_tracks]:
+        simplified = simplify_track(track, tolerance_meters)
+        locations = [(lat, lng) for _, lat, lng in simplified]
+        if len(locations) > 1:
+            folium.PolyLine(locations, color='blue', weight=2, opacity=0.6,
+                            tooltip=f"{entity_id}: {len(track)} points").add_to(m)
+        folium.CircleMarker(location=locations[-1], radius=3, color='blue', fill=True,
+                            popup=f"ID: {entity_id}").add_to(m)
     return m
 
 
 def generate_zone_alerts(entities: List[Dict], zones: List) -> List[Dict]:
     """
-    Generate alerts based on zone violations and density thresholds
+    Generate alerts based on zone violations and density thresholds.
+    Stateless snapshot: every entity inside a restricted zone is reported on
+    every call; use fence_engine.FenceEngine to get transitions only.
     """
     alerts = []
+    membership = zone_members(entities, zones)
     
-    for zone in zones:
+    for zone, inside in zip(zones, membership):
         # Calculate density in zone
-        density = calculate_zone_density(entities, zone['center_lat'], 
-                                       zone['center_lng'], zone['radius_meters'])
+        density = len(inside)
         
         # Check density threshold
         density_threshold = 100  # Default value
@@ -255,19 +624,17 @@ def generate_zone_alerts(entities: List[Dict], zones: List) -> List[Dict]:
         
         # Check for entities entering restricted/danger zones
         if zone['zone_type'] in ['restricted', 'danger']:
-            for entity in entities:
-                if is_point_in_circle(entity['lat'], entity['lng'], 
-                                    zone['center_lat'], zone['center_lng'], 
-                                    zone['radius_meters']):
-                    alerts.append({
-                        'zone_id': zone['id'],
-                        'alert_type': 'unauthorized_entry',
-                        'entity_id': entity['id'],
-                        'entity_lat': entity['lat'],
-                        'entity_lng': entity['lng'],
-                        'message': f"{entity['name']} entered {zone['name']} ({zone['zone_type']} zone)",
-                        'severity': 'critical' if zone['zone_type'] == 'danger' else 'high'
-                    })
+            for idx in inside:
+                entity = entities[idx]
+                alerts.append({
+                    'zone_id': zone['id'],
+                    'alert_type': 'unauthorized_entry',
+                    'entity_id': entity['id'],
+                    'entity_lat': entity['lat'],
+                    'entity_lng': entity['lng'],
+                    'message': f"{entity['name']} entered {zone['name']} ({zone['zone_type']} zone)",
+                    'severity': 'critical' if zone['zone_type'] == 'danger' else 'high'
+                })
     
     return alerts
 
@@ -300,16 +667,14 @@ def get_zone_statistics(zones: List, entities: List[Dict]) -> Dict:
         'alerts_by_type': {}
     }
     
-    for zone in zones:
+    densities = calculate_zone_densities(entities, zones)
+    
+    for zone, density in zip(zones, densities):
         zone_type = zone['zone_type']
         if zone_type not in stats['zone_breakdown']:
             stats['zone_breakdown'][zone_type] = 0
         stats['zone_breakdown'][zone_type] += 1
         
-        # Calculate density for this zone
-        density = calculate_zone_density(entities, zone['center_lat'], 
-                                       zone['center_lng'], zone['radius_meters'])
-        
         # Use dictionary-style access with a fallback for sqlite3.Row objects
         density_threshold = 100  # Default value
         if 'density_threshold' in zone:
@@ -0,0 +1,58 @@
+"""
+Great circle distances shared by the database, spatial index and map code.
+Only depends on numpy, so db.py can use it without the UI stack.
+"""
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+
+def _half_angle_terms(lats, lngs):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    return np.sin(lat / 2), np.cos(lat / 2), np.sin(lng / 2), np.cos(lng / 2), np.cos(lat)
+
+
+def haversine_terms(lats1, lngs1, lats2, lngs2, pairwise: bool = False) -> np.ndarray:
+    """
+    The haversine 'a' term, element by element (inputs broadcast together)
+    or, with pairwise=True, for every pair shaped len(set 1) x len(set 2).
+    sin((x2 - x1) / 2) is expanded with the angle-difference identity, so the
+    trig runs once per point and the pairwise work is only multiply/add.
+    """
+    mul = np.multiply.outer if pairwise else np.multiply
+    slat1, clat1, slng1, clng1, cos1 = _half_angle_terms(lats1, lngs1)
+    slat2, clat2, slng2, clng2, cos2 = _half_angle_terms(lats2, lngs2)
+    dlat = mul(clat1, slat2)
+    dlat -= mul(slat1, clat2)
+    dlng = mul(clng1, slng2)
+    dlng -= mul(slng1, clng2)
+    dlat *= dlat
+    dlng *= dlng
+    dlng *= mul(cos1, cos2)
+    dlat += dlng
+    return dlat
+
+
+def _distance(a):
+    a = np.clip(a, 0.0, 1.0)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """
+    Great circle distance in meters between points in decimal degrees.
+    Accepts scalars (returns a float) or arrays that broadcast together.
+    """
+    d = _distance(haversine_terms(lat1, lng1, lat2, lng2))
+    return float(d) if np.ndim(d) == 0 else d
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+    """
+    Great circle distances in meters between every point of set 1 and every
+    point of set 2 (decimal degrees). Returns a len(set 1) x len(set 2) array.
+    """
+    a = haversine_terms(lats1, lngs1, lats2, lngs2, pairwise=True)
+    np.clip(a, 0.0, 1.0, out=a)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a, out=a), out=a)
@@ -0,0 +1,307 @@
+"""
+Standalone position ingestion service.
+
+Listens for position reports over UDP datagrams and/or TCP streams, one
+report per line, either CSV ``id,lat,lng[,epoch_seconds[,name]]`` or a JSON
+object with ``id``, ``lat``, ``lng`` and optional ``ts``/``name``. Reports
+are coalesced per entity (latest wins) and flushed in batches: each batch
+updates tracking_entities, appends to the trajectory history, runs the
+geo-fence engine once and stores the resulting alerts, all in a single
+transaction.
+
+    python ingest.py --udp-port 9870 --tcp-port 9871
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db import (add_geo_alerts_bulk, add_trajectory_points, list_zones, start_retention_worker,
+                transaction, update_tracking_locations_bulk, upsert_tracking_entities_bulk)
+from fence_engine import FenceEngine
+
+log = logging.getLogger("eventguard.ingest")
+
+Report = Tuple[str, float, float, Optional[float], Optional[str]]
+
+# How far ahead of the local clock a report's timestamp may be
+MAX_CLOCK_SKEW_SECONDS = 3600.0
+
+
+def parse_report(line: str) -> Optional[Report]:
+    """
+    (id, lat, lng, ts, name) for one report line, or None if it is blank,
+    malformed or out of range (non-finite or off-globe coordinates, negative
+    or far-future timestamps).
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        if line.startswith("{"):
+            data = json.loads(line)
+            ts = data.get("ts")
+            report = (str(data["id"]), float(data["lat"]), float(data["lng"]),
+                      float(ts) if ts is not None else None, data.get("name"))
+        else:
+            parts = line.split(",")
+            ts = float(parts[3]) if len(parts) > 3 and parts[3] else None
+            name = parts[4].strip() if len(parts) > 4 else None
+            report = (parts[0].strip(), float(parts[1]), float(parts[2]), ts, name)
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+    entity_id, lat, lng, ts, _ = report
+    # NaN fails every comparison, so these also reject non-finite values
+    if not entity_id or not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    if ts is not None and not 0.0 <= ts <= time.time() + MAX_CLOCK_SKEW_SECONDS:
+        return None
+    return report
+
+
+class LiveFleet:
+    """
+    Growable columnar positions for entities keyed by their external id.
+    Exposes ``lat``/``lng`` arrays like EntityStore, so geo_utils and the
+    fence engine treat it the same way.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lng = np.empty(capacity, dtype=np.float64)
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._saved = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self._lat[:len(self.ids)]
+
+    @property
+    def lng(self) -> np.ndarray:
+        return self._lng[:len(self.ids)]
+
+    def __getitem__(self, i: int) -> Dict:
+        return {"id": self.ids[i], "name": self.names[i], "entity_type": "person",
+                "lat": float(self._lat[i]), "lng": float(self._lng[i])}
+
+    def _reserve(self, n: int):
+        if n > len(self._lat):
+            capacity = max(n, 2 * len(self._lat))
+            for name in ("_lat", "_lng"):
+                grown = np.empty(capacity, dtype=np.float64)
+                grown[:len(self.ids)] = getattr(self, name)[:len(self.ids)]
+                setattr(self, name, grown)
+
+    def snapshot(self):
+        """
+        Mark the fleet for restore() if the next batch is not stored. The
+        following apply() saves the old position of each entity it moves,
+        instead of the whole fleet being copied up front.
+        """
+        self._saved = {}
+        return len(self.ids), self._saved
+
+    def restore(self, snapshot):
+        n, saved = snapshot
+        for entity_id in self.ids[n:]:
+            del self._index[entity_id]
+        del self.ids[n:]
+        del self.names[n:]
+        for i, (lat, lng) in saved.items():
+            self._lat[i] = lat
+            self._lng[i] = lng
+
+    def apply(self, reports) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Apply coalesced reports. Returns (new entity rows, moved entity rows)
+        shaped for upsert_tracking_entities_bulk / update_tracking_locations_bulk.
+        """
+        new_rows, moved_rows = [], []
+        saved, self._saved = self._saved, None
+        self._reserve(len(self.ids) + len(reports))
+        for entity_id, lat, lng, ts, name in reports:
+            stamp = datetime.utcfromtimestamp(ts).isoformat() if ts else datetime.utcnow().isoformat()
+            i = self._index.get(entity_id)
+            if i is None:
+                i = self._index[entity_id] = len(self.ids)
+                self.ids.append(entity_id)
+                self.names.append(name or entity_id)
+                new_rows.append({"id": entity_id, "name": name or entity_id, "lat": lat,
+                                 "lng": lng, "timestamp": stamp})
+            else:
+                moved_rows.append({"id": entity_id, "lat": lat, "lng": lng, "timestamp": stamp})
+                if saved is not None:
+                    saved.setdefault(i, (self._lat[i], self._lng[i]))
+            self._lat[i] = lat
+            self._lng[i] = lng
+        return new_rows, moved_rows
+
+
+class Ingestor:
+    """
+    Buffers reports from the listeners and flushes them in batches every
+    ``flush_interval`` seconds, or sooner once ``max_batch`` distinct
+    entities are pending. Batches are processed one at a time on a worker
+    thread, so the event loop keeps accepting reports meanwhile.
+    """
+
+    def __init__(self, flush_interval: float = 0.25, max_batch: int = 5000,
+                 zone_refresh: float = 10.0, engine: FenceEngine = None):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.zone_refresh = zone_refresh
+        self.fleet = LiveFleet()
+        self.engine = engine or FenceEngine()
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+        self._pending: Dict[str, Report] = {}
+        self._wake = asyncio.Event()
+        self._zones = []
+        self._zones_loaded_at = 0.0
+
+    def submit(self, line: str):
+        report = parse_report(line)
+        if report is None:
+            if line.strip():
+                self.rejected += 1
+            return
+        self.received += 1
+        self._pending[report[0]] = report
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def submit_lines(self, data: bytes):
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            self.submit(line)
+
+    def zones(self):
+        # Zones change rarely; re-read them every zone_refresh seconds
+        if time.monotonic() - self._zones_loaded_at >= self.zone_refresh:
+            self._zones = list_zones(active_only=True)
+            self._zones_loaded_at = time.monotonic()
+        return self._zones
+
+    def process_batch(self, reports) -> Dict:
+        """
+        Apply one batch and store it. If storing fails, the fleet and the
+        fence engine are put back as they were, so in-memory state never runs
+        ahead of the database and the entities' next reports are evaluated
+        against what was actually stored.
+        """
+        started = time.perf_counter()
+        fleet_state, engine_state = self.fleet.snapshot(), self.engine.snapshot()
+        try:
+            new_rows, moved_rows = self.fleet.apply(reports)
+            alerts = self.engine.update(self.fleet, self.zones())
+            now = time.time()
+            with transaction():
+                upsert_tracking_entities_bulk(new_rows)
+                update_tracking_locations_bulk(moved_rows)
+                add_trajectory_points((entity_id, ts or now, lat, lng)
+                                      for entity_id, lat, lng, ts, _ in reports)
+                add_geo_alerts_bulk(alerts)
+        except Exception:
+            self.fleet.restore(fleet_state)
+            self.engine.restore(engine_state)
+            raise
+        return {
+            "reports": len(reports),
+            "new": len(new_rows),
+            "alerts": len(alerts),
+            "seconds": time.perf_counter() - started,
+        }
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            stats = await asyncio.to_thread(self.process_batch, list(batch.values()))
+        except Exception:
+            # Keep serving; the batch is dropped and its entities resync on their next report
+            self.failed += len(batch)
+            log.exception("batch of %d reports failed and was dropped", len(batch))
+            return
+        log.info("batch: %(reports)d entities (%(new)d new), %(alerts)d alerts in %(seconds).3fs",
+                 stats)
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, ingestor: Ingestor):
+        self.ingestor = ingestor
+
+    def datagram_received(self, data, addr):
+        self.ingestor.submit_lines(data)
+
+
+async def _handle_tcp(ingestor: Ingestor, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        async for line in reader:
+            ingestor.submit(line.decode("utf-8", errors="replace"))
+    finally:
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", udp_port: int = None, tcp_port: int = None,
+                **ingestor_kwargs):
+    ingestor = Ingestor(**ingestor_kwargs)
+    loop = asyncio.get_running_loop()
+    closers = []
+    if udp_port:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UDPProtocol(ingestor), local_addr=(host, udp_port))
+        closers.append(transport.close)
+        log.info("listening for UDP reports on %s:%d", host, udp_port)
+    if tcp_port:
+        server = await asyncio.start_server(
+            lambda r, w: _handle_tcp(ingestor, r, w), host, tcp_port)
+        closers.append(server.close)
+        log.info("listening for TCP reports on %s:%d", host, tcp_port)
+    try:
+        await ingestor.run()
+    finally:
+        for close in closers:
+            close()
+        await ingestor.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EventGuard position ingestion service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--udp-port", type=int, default=9870)
+    parser.add_argument("--tcp-port", type=int, default=9871)
+    parser.add_argument("--flush-interval", type=float, default=0.25)
+    parser.add_argument("--max-batch", type=int, default=5000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    # Prune trajectories and aged alerts even when the web app is not running
+    start_retention_worker()
+    try:
+        asyncio.run(serve(args.host, args.udp_port, args.tcp_port,
+                          flush_interval=args.flush_interval, max_batch=args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
+import threading
+from collections import OrderedDict
 from typing import List, Tuple, Optional
 
 try:
@@ -8,8 +10,21 @@ except Exception:
 
 import folium
 from folium.plugins import HeatMap
+from folium.utilities import image_to_url
+import numpy as np
 import requests
 
+from density_grid import DensityGrid
+
+# Heat layers with more points than this are aggregated per grid cell
+HEATMAP_MAX_POINTS = 2000
+HEATMAP_CELL_METERS = 10.0
+
+# Process-wide LRU of static map layers, see cached_layer()
+MAP_LAYER_CACHE_SIZE = 32
+_map_layers = OrderedDict()
+_map_layers_lock = threading.Lock()
+
 
 def _maps_api_key() -> str:
     key = ""
@@ -62,11 +77,61 @@ def geocode_location(query: str):
     return None
 
 
+def _heat_data(points: List[Tuple[float, float, float]]) -> List[Tuple[float, float, float]]:
+    """
+    HeatMap input for a point list. Large inputs are binned into a
+    DensityGrid and rendered one weighted point per cell, so the page payload
+    is bounded by the venue area rather than the number of points.
+    """
+    if len(points) <= HEATMAP_MAX_POINTS:
+        return [(lat, lon, weight) for lat, lon, weight in points]
+    data = np.asarray(points, dtype=np.float64)
+    grid = DensityGrid(data[:, 0], data[:, 1], weights=data[:, 2],
+                       cell_meters=HEATMAP_CELL_METERS, sigma_cells=1.0)
+    return grid.heat_points()
+
+
+def cached_layer(key, build):
+    """
+    Static map layer data for key, computed with build() on a miss.
+
+    Streamlit reruns rebuild every map from scratch, but the expensive parts
+    (the base64-encoded blueprint image, zone geometry) only change with the
+    event, blueprint or zones, so they are cached here process-wide and the
+    key must capture those inputs. Cached values are shared between reruns
+    and sessions and must not be mutated; callers wrap them in fresh folium
+    layers, which is cheap.
+    """
+    with _map_layers_lock:
+        value = _map_layers.get(key)
+        if value is not None:
+            _map_layers.move_to_end(key)
+            return value
+    value = build()
+    with _map_layers_lock:
+        _map_layers[key] = value
+        while len(_map_layers) > MAP_LAYER_CACHE_SIZE:
+            _map_layers.popitem(last=False)
+    return value
+
+
+def blueprint_key(blueprint):
+    """Cache key component for a venue_blueprints row (None when there is none)."""
+    if not blueprint:
+        return None
+    return (blueprint['id'], blueprint['uploaded_at'], blueprint['file_path'])
+
+
+def blueprint_image_url(blueprint) -> str:
+    """Blueprint image as a data URL, read and base64-encoded once per blueprint."""
+    return cached_layer(("blueprint_image", blueprint_key(blueprint)),
+                        lambda: image_to_url(blueprint['file_path']))
+
+
 def create_heatmap(base_location: Tuple[float, float], points: List[Tuple[float, float, float]]):
     m = folium.Map(location=base_location, zoom_start=15, tiles="OpenStreetMap")
     if points:
-        heat_data = [(lat, lon, weight) for lat, lon, weight in points]
-        HeatMap(heat_data, radius=18).add_to(m)
+        HeatMap(_heat_data(points), radius=18).add_to(m)
     return m
 
 
@@ -157,7 +222,11 @@ def add_route_to_map(m: folium.Map, points: List[Tuple[float, float]], color: st
 
 
 def get_current_event_blueprint():
-    """Get blueprint for the current event"""
+    """
+    Get blueprint for the current event. The lookup is kept in the session
+    keyed on (user, event), so reruns do not re-query it; call
+    forget_event_blueprint() after adding or changing a blueprint.
+    """
     if st is None:
         return None
     
@@ -173,6 +242,11 @@ def get_current_event_blueprint():
         if not current_event_name:
             return None
         
+        key = (user_id, current_event_name)
+        cached = st.session_state.get("event_blueprint")
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
         # Find the event
         events = list_events_by_user(user_id)
         event = None
@@ -181,17 +255,21 @@ def get_current_event_blueprint():
                 event = e
                 break
         
-        if not event:
-            return None
-        
         # Get blueprint for this event
-        blueprint = get_blueprint_by_event(event['id'])
+        blueprint = get_blueprint_by_event(event['id']) if event else None
+        st.session_state["event_blueprint"] = (key, blueprint)
         return blueprint
         
     except Exception:
         return None
 
 
+def forget_event_blueprint():
+    """Drop the session's cached blueprint lookup so the next map re-reads it."""
+    if st is not None:
+        st.session_state.pop("event_blueprint", None)
+
+
 def create_heatmap_with_blueprint(base_location: Tuple[float, float], points: List[Tuple[float, float, float]]):
     """Create heatmap with blueprint overlay if available"""
     # Get current event blueprint
@@ -222,7 +300,7 @@ def create_heatmap_with_blueprint(base_location: Tuple[float, float], points: Li
         ]
         
         img_overlay = folium.raster_layers.ImageOverlay(
-            image=blueprint['file_path'],
+            image=blueprint_image_url(blueprint),
             bounds=blueprint_bounds,
             opacity=0.8,
             interactive=True,
@@ -232,8 +310,7 @@ def create_heatmap_with_blueprint(base_location: Tuple[float, float], points: Li
         
         # Add heatmap if points provided
         if points:
-            heat_data = [(lat, lon, weight) for lat, lon, weight in points]
-            HeatMap(heat_data, radius=18).add_to(m)
+            HeatMap(_heat_data(points), radius=18).add_to(m)
         
         # Add blueprint bounds rectangle
         folium.Rectangle(
@@ -281,7 +358,7 @@ def create_map_with_blueprint(base_location: Tuple[float, float], **kwargs):
         ]
         
         img_overlay = folium.raster_layers.ImageOverlay(
-            image=blueprint['file_path'],
+            image=blueprint_image_url(blueprint),
             bounds=blueprint_bounds,
             opacity=kwargs.get('blueprint_opacity', 0.8),
             interactive=True,
@@ -0,0 +1,184 @@
+"""
+Grid indexes for venue-scale spatial queries: EntityGridIndex answers
+"which entities are within r meters of this point" and ZoneGridIndex
+"which zones may contain these points", both by bucketing into square
+cells on a local equirectangular projection so a query only touches the
+cells it overlaps.
+"""
+from typing import Tuple
+
+import numpy as np
+
+from geodesy import EARTH_RADIUS_M, haversine_m
+
+
+def _project(lats, lngs, origin_lat: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Equirectangular projection to meters around origin_lat. Accurate to well
+    under a percent across a venue, which is all the grid needs: exact
+    distances are re-checked with haversine on the candidates.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    x = np.radians(lngs) * EARTH_RADIUS_M * np.cos(np.radians(origin_lat))
+    y = np.radians(lats) * EARTH_RADIUS_M
+    return x, y
+
+
+class EntityGridIndex:
+    """
+    Uniform grid over entity positions for "entities within r meters of a
+    point" queries.
+
+    Points are bucketed into square cells of ``cell_meters`` and sorted by
+    cell key (row-major), so the cells of one grid row that overlap a query
+    circle form a contiguous key range found with a single searchsorted. A
+    query touches O(r / cell_meters) rows and only the entities in those
+    cells, independent of the total number of entities.
+    """
+
+    def __init__(self, lats, lngs, cell_meters: float = 50.0, origin_lat: float = None):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_meters = float(cell_meters)
+        if origin_lat is None:
+            origin_lat = float(self.lats.mean()) if len(self.lats) else 0.0
+        self.origin_lat = origin_lat
+        self._build()
+
+    def _build(self):
+        x, y = _project(self.lats, self.lngs, self.origin_lat)
+        cx = np.floor(x / self.cell_meters).astype(np.int64)
+        cy = np.floor(y / self.cell_meters).astype(np.int64)
+        if len(cx):
+            self._cx0, self._cy0 = int(cx.min()), int(cy.min())
+            self._width = int(cx.max()) - self._cx0 + 1
+            self._height = int(cy.max()) - self._cy0 + 1
+        else:
+            self._cx0 = self._cy0 = 0
+            self._width = self._height = 0
+        keys = (cy - self._cy0) * self._width + (cx - self._cx0)
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def _candidates(self, lat: float, lng: float, radius_m: float) -> np.ndarray:
+        if not self._width:
+            return np.empty(0, dtype=np.int64)
+        x, y = _project([lat], [lng], self.origin_lat)
+        x0 = int(np.floor((x[0] - radius_m) / self.cell_meters)) - self._cx0
+        x1 = int(np.floor((x[0] + radius_m) / self.cell_meters)) - self._cx0
+        y0 = int(np.floor((y[0] - radius_m) / self.cell_meters)) - self._cy0
+        y1 = int(np.floor((y[0] + radius_m) / self.cell_meters)) - self._cy0
+        x0, x1 = max(x0, 0), min(x1, self._width - 1)
+        y0, y1 = max(y0, 0), min(y1, self._height - 1)
+        if x0 > x1 or y0 > y1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(y0, y1 + 1, dtype=np.int64) * self._width
+        starts = np.searchsorted(self._keys, rows + x0, side="left")
+        ends = np.searchsorted(self._keys, rows + x1, side="right")
+        if not len(starts):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+
+    def query_radius(self, lat: float, lng: float, radius_m: float) -> np.ndarray:
+        """Indices of entities within radius_m meters of (lat, lng)."""
+        indices, _ = self.query_radius_with_distances(lat, lng, radius_m)
+        return indices
+
+    def query_radius_with_distances(self, lat: float, lng: float,
+                                    radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted indices of entities within radius_m, and their distances in meters."""
+        candidates = self._candidates(lat, lng, radius_m)
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float64)
+        distances = haversine_m(self.lats[candidates], self.lngs[candidates], lat, lng)
+        keep = distances <= radius_m
+        order = np.argsort(candidates[keep])
+        return candidates[keep][order], distances[keep][order]
+
+
+class ZoneGridIndex:
+    """
+    Grid over zone bounding boxes (south, west, north, east in degrees) for
+    "which zones may contain this point" lookups. Callers pass the box of a
+    circle or of a polygon's vertices, already widened by any margin they
+    need. Each zone is registered in every cell its box overlaps and the
+    (cell, zone) pairs are kept sorted by cell, so a batch of points is
+    matched with one searchsorted and then filtered by the exact boxes; cost
+    follows the number of points and nearby zones, not the number of zones.
+    """
+
+    def __init__(self, south, west, north, east, cell_meters: float = None,
+                 origin_lat: float = None):
+        self.south = np.asarray(south, dtype=np.float64)
+        self.west = np.asarray(west, dtype=np.float64)
+        self.north = np.asarray(north, dtype=np.float64)
+        self.east = np.asarray(east, dtype=np.float64)
+        if origin_lat is None:
+            origin_lat = float((self.south + self.north).mean() / 2) if len(self.south) else 0.0
+        self.origin_lat = origin_lat
+        x0, y0 = _project(self.south, self.west, origin_lat)
+        x1, y1 = _project(self.north, self.east, origin_lat)
+        if cell_meters is None:
+            sizes = np.maximum(x1 - x0, y1 - y0)
+            cell_meters = float(np.median(sizes)) if len(sizes) else 100.0
+        self.cell_meters = max(float(cell_meters), 1.0)
+        cx0 = np.floor(x0 / self.cell_meters).astype(np.int64)
+        cy0 = np.floor(y0 / self.cell_meters).astype(np.int64)
+        cx1 = np.floor(x1 / self.cell_meters).astype(np.int64)
+        cy1 = np.floor(y1 / self.cell_meters).astype(np.int64)
+        if len(cx0):
+            self._cx0, self._cy0 = int(cx0.min()), int(cy0.min())
+            self._width = int(cx1.max()) - self._cx0 + 1
+            self._height = int(cy1.max()) - self._cy0 + 1
+        else:
+            self._cx0 = self._cy0 = 0
+            self._width = self._height = 0
+        keys, zones = [], []
+        for i in range(len(cx0)):
+            cols = np.arange(cx0[i], cx1[i] + 1) - self._cx0
+            rows = np.arange(cy0[i], cy1[i] + 1) - self._cy0
+            cell_keys = (rows[:, None] * self._width + cols[None, :]).ravel()
+            keys.append(cell_keys)
+            zones.append(np.full(len(cell_keys), i, dtype=np.int64))
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        zones = np.concatenate(zones) if zones else np.empty(0, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._zones = zones[order]
+
+    def __len__(self) -> int:
+        return len(self.south)
+
+    def candidates(self, lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (point indices, zone indices) of every point lying inside a zone's
+        box, ordered by zone and then point.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        empty = np.empty(0, dtype=np.int64)
+        if not self._width or not len(lats):
+            return empty, empty
+        x, y = _project(lats, lngs, self.origin_lat)
+        cx = np.floor(x / self.cell_meters).astype(np.int64) - self._cx0
+        cy = np.floor(y / self.cell_meters).astype(np.int64) - self._cy0
+        on_grid = np.flatnonzero((cx >= 0) & (cx < self._width) & (cy >= 0) & (cy < self._height))
+        keys = cy[on_grid] * self._width + cx[on_grid]
+        starts = np.searchsorted(self._keys, keys, side="left")
+        counts = np.searchsorted(self._keys, keys, side="right") - starts
+        total = int(counts.sum())
+        if not total:
+            return empty, empty
+        points = np.repeat(on_grid, counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        zones = self._zones[np.repeat(starts, counts) + offsets]
+        inside = ((lats[points] >= self.south[zones]) & (lats[points] <= self.north[zones])
+                  & (lngs[points] >= self.west[zones]) & (lngs[points] <= self.east[zones]))
+        points, zones = points[inside], zones[inside]
+        order = np.lexsort((points, zones))
+        return points[order], zones[order]
+
+    def zones_containing(self, lat: float, lng: float) -> np.ndarray:
+        """Indices of the zones whose box contains (lat, lng)."""
+        return self.candidates([lat], [lng])[1]